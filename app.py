@@ -1,28 +1,31 @@
-import pickle
 import warnings
 
-import yaml
-
 from data.dataset import create_dataset
 from tools import filter_inference_images
-from tools import train, inference
+from tools import train, update, inference
 from utils import plot
+from utils import profiling
+from utils.config import get_config
 from utils.logger import setup_logger
+from utils.models import warm_up
 
 warnings.filterwarnings("ignore")
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = setup_logger(config['logger']['app_name'])
 
 
 def main():
+    profiling.enable(config['profiling']['enabled'])
+
     if config['images']['download']:
         logger.info('Started creating dataset')
         create_dataset(
             names=config['images']['labels'],
             output_folder=config['images']['root'],
             img_number=100,
-            delete_existing=True,
+            # existing folders are kept, so an interrupted download resumes with the names not fetched yet
+            delete_existing=False,
             clean=True,
             img_size=(config['images']['width'], config['images']['height']),
             valid_format=config['images']['mode'],
@@ -32,16 +35,15 @@ def main():
 
     if config['train']['do_train']:
         logger.info('Started training')
-        embeddings = None
-
-        if config['train']['load_embeddings']:
-            with open(config['embeddings']['path'], 'rb') as input_file:
-                embeddings = pickle.load(input_file)
-            logger.info('Embeddings loaded successfully')
-
-        train(root=config['images']['root'], embeddings=embeddings)
+        if config['train']['incremental']:
+            update(root=config['images']['root'])
+        else:
+            train(root=config['images']['root'], load_embeddings=config['train']['load_embeddings'])
         logger.info('Finished training')
 
+    logger.info('Warming up models')
+    warm_up()
+
     input_image_folder = config['inference']['images_folder']
     valid_input_imgs = filter_inference_images(input_image_folder)
 
@@ -53,6 +55,11 @@ def main():
     plot(valid_input_imgs, pred_imgs, labels)
     logger.info('Results saved in a file result.png')
 
+    if config['profiling']['enabled']:
+        logger.info(f'Stage timings:\n{profiling.format_summary()}')
+        profiling.save_trace(config['profiling']['trace_path'])
+        logger.info(f'Trace saved in a file {config["profiling"]["trace_path"]}')
+
 
 if __name__ == '__main__':
     main()
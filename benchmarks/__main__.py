@@ -0,0 +1,85 @@
+import argparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import warnings
+
+from .cases import CASES
+from .corpus import generate_corpus
+from .harness import compare, format_results, load_baseline, measure, save_baseline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark hot paths on a synthetic face dataset',
+                                     prog='python -m benchmarks')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='benchmarks to run')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[32, 128], help='dataset sizes(number of images)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best one is reported')
+    parser.add_argument('--seed', type=int, default=0, help='seed of synthetic dataset')
+    parser.add_argument('--workdir', help='scratch folder. Temporary folder is used and removed if not given')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline .json file to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--compare', action='store_true',
+                        help='fail if there is no baseline to compare with instead of only reporting results')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative throughput drop and peak memory growth before a run fails')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    baseline = load_baseline(args.baseline)
+
+    # checked before running, so a misconfigured comparison fails fast
+    if args.compare and not baseline and not args.save_baseline:
+        print(f'No baseline found in {args.baseline}. Create it with '
+              f'`python -m benchmarks --save-baseline --baseline {args.baseline}` on the reference machine',
+              file=sys.stderr)
+        sys.exit(2)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='benchmarks-')
+    results = {}
+
+    try:
+        for size in args.sizes:
+            corpus = generate_corpus(os.path.join(workdir, f'corpus-{size}'), n_images=size, seed=args.seed)
+
+            for name in args.cases:
+                try:
+                    case = CASES[name](corpus, os.path.join(workdir, 'scratch'))
+                except ModuleNotFoundError as e:
+                    print(f'Skipped {name}: {e}', file=sys.stderr)
+                    continue
+
+                results[f'{name}[{size}]'] = measure(case, repeat=args.repeat)
+                print(f'{name}[{size}]: {results[f"{name}[{size}]"]["items_per_s"]:.2f} items/s', file=sys.stderr)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        machine = {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+        save_baseline(args.baseline, {**baseline, **results}, machine=machine)
+        print(f'Baseline saved in {args.baseline}')
+        return
+
+    if not baseline:
+        print(f'No baseline found in {args.baseline}, run with --save-baseline to create it')
+        return
+
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f'Not in baseline, not compared: {", ".join(missing)}')
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('Regressions:\n' + '\n'.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import contextlib
+import os
+import shutil
+from typing import Callable, Dict, Iterator, Optional
+
+from PIL import Image
+
+from utils.config import get_config
+from .corpus import Corpus
+
+config = get_config()
+
+
+class Case:
+    """
+    Class to hold one prepared benchmark: run is timed, prepare is called before every run and is not timed
+    """
+
+    def __init__(self, run: Callable[[], object], items: int, prepare: Optional[Callable[[], None]] = None) -> None:
+        """
+        :param run: function running the measured code path
+        :param items: number of items(images) processed by one run
+        :param prepare: optional, function restoring run input, e.g. a fresh copy of images modified in place
+        """
+
+        self.run = run
+        self.items = items
+        self.prepare = prepare or (lambda: None)
+
+
+@contextlib.contextmanager
+def _override_config(section: str, **values) -> Iterator[None]:
+    """
+    Temporarily replaces values of the shared config, so trained artifacts go to the scratch folder
+
+    :param section: config section name
+    :param values: new values
+    """
+
+    old_values = dict(config[section])
+    config[section].update(values)
+    try:
+        yield
+    finally:
+        config[section].clear()
+        config[section].update(old_values)
+
+
+def _load_models() -> None:
+    """
+    Loads and warms up models before timing, so model loading is not measured
+    """
+
+    from utils.models import warm_up
+
+    warm_up()
+
+
+def _in_place(corpus: Corpus, workdir: str, run: Callable[[Corpus], object]) -> Case:
+    """
+    Creates case for code path which modifies images: every run gets a fresh copy of the corpus
+
+    :param corpus: source corpus
+    :param workdir: scratch folder
+    :param run: function of the corpus copy
+    """
+
+    state = {}
+
+    def prepare() -> None:
+        state['corpus'] = corpus.copy(os.path.join(workdir, 'copy'))
+
+    return Case(run=lambda: run(state['corpus']), items=len(corpus.paths), prepare=prepare)
+
+
+def convert(corpus: Corpus, workdir: str) -> Case:
+    from utils.img_utils import ImageBatchProcessor
+
+    return _in_place(corpus, workdir, lambda copy: ImageBatchProcessor().convert(copy.paths, config['images']['mode']))
+
+
+def resize(corpus: Corpus, workdir: str) -> Case:
+    from utils.img_utils import ImageBatchProcessor
+
+    size = (config['images']['width'], config['images']['height'])
+
+    return _in_place(corpus, workdir, lambda copy: ImageBatchProcessor().resize(copy.paths, size))
+
+
+def transform(corpus: Corpus, workdir: str) -> Case:
+    from utils.img_utils import ImageBatchProcessor
+
+    images = config['images']
+
+    return _in_place(corpus, workdir, lambda copy: ImageBatchProcessor().transform(
+        copy.paths, mode=images['mode'], size=(images['width'], images['height']), extension=images['extension']
+        ))
+
+
+def deduplicate(corpus: Corpus, workdir: str) -> Case:
+    from utils.img_utils import DuplicatesHandler
+
+    return Case(run=lambda: DuplicatesHandler(similarity=90).handle(corpus.paths), items=len(corpus.paths))
+
+
+def clean_folder(corpus: Corpus, workdir: str) -> Case:
+    from data.dataset import DatasetCleaner
+
+    _load_models()
+    images = config['images']
+
+    def run(copy: Corpus) -> None:
+        cleaner = DatasetCleaner(
+            root=copy.root,
+            img_size=(images['width'], images['height']),
+            valid_extension=images['extension'],
+            valid_format=images['mode']
+            )
+
+        for folder_path in copy.folder_paths():
+            cleaner.clean_folder(folder_path)
+
+    return _in_place(corpus, workdir, run)
+
+
+def extract_face(corpus: Corpus, workdir: str) -> Case:
+    from face_processing import extract_face
+
+    _load_models()
+
+    return Case(run=lambda: extract_face(corpus.paths), items=len(corpus.paths))
+
+
+def get_embedding(corpus: Corpus, workdir: str) -> Case:
+    from embeddings import get_embedding
+
+    _load_models()
+    faces = [Image.open(path).convert('RGB').resize((160, 160)) for path in corpus.paths]
+
+    return Case(run=lambda: get_embedding(faces, progress=False), items=len(faces))
+
+
+def _artifact_paths(workdir: str) -> Dict[str, Dict[str, str]]:
+    """
+    :return: dict of config section -> overridden paths of trained artifacts inside workdir
+    """
+
+    return {
+        'embeddings': {
+            'path': os.path.join(workdir, 'embeddings', 'gallery.npy'),
+            'cache_dir': os.path.join(workdir, 'embeddings', 'cache')
+        },
+        'manifest': {
+            'path': os.path.join(workdir, 'manifest.json')
+        },
+        'model': {
+            'index_path': os.path.join(workdir, 'model', 'images_index.pickle'),
+            'encoder_path': os.path.join(workdir, 'model', 'label_encoder.pickle'),
+            'row_index_path': os.path.join(workdir, 'model', 'row_index.npz')
+        }
+    }
+
+
+def train(corpus: Corpus, workdir: str) -> Case:
+    from tools import train
+
+    _load_models()
+    paths = _artifact_paths(workdir)
+    state = {}
+
+    def prepare() -> None:
+        # embedding cache is dropped too, otherwise every run after the first one only reads cached embeddings
+        shutil.rmtree(os.path.join(workdir, 'embeddings'), ignore_errors=True)
+        if os.path.exists(paths['manifest']['path']):
+            os.remove(paths['manifest']['path'])
+        os.makedirs(os.path.join(workdir, 'model'), exist_ok=True)
+        state['corpus'] = corpus.copy(os.path.join(workdir, 'copy'))
+
+    def run() -> None:
+        with _override_config('embeddings', **paths['embeddings']), _override_config('model', **paths['model']), \
+                _override_config('manifest', **paths['manifest']), _override_config('images', labels=corpus.labels):
+            train(root=state['corpus'].root)
+
+    return Case(run=run, items=len(corpus.paths), prepare=prepare)
+
+
+def inference(corpus: Corpus, workdir: str) -> Case:
+    from tools import inference
+
+    paths = _artifact_paths(workdir)
+    train_case = train(corpus, workdir)
+    train_case.prepare()
+    train_case.run()
+
+    def run() -> None:
+        with _override_config('model', **paths['model']):
+            inference(corpus.paths)
+
+    return Case(run=run, items=len(corpus.paths))
+
+
+CASES: Dict[str, Callable[[Corpus, str], Case]] = {
+    'ImageBatchProcessor.convert': convert,
+    'ImageBatchProcessor.resize': resize,
+    'ImageBatchProcessor.transform': transform,
+    'DuplicatesHandler.handle': deduplicate,
+    'DatasetCleaner.clean_folder': clean_folder,
+    'extract_face': extract_face,
+    'get_embedding': get_embedding,
+    'train': train,
+    'inference': inference
+}
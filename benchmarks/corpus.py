@@ -0,0 +1,160 @@
+import os
+import shutil
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+
+class Corpus:
+    """
+    Class to hold synthetic dataset laid out like the real one: root/<label>/<image>
+    """
+
+    def __init__(self, root: str, paths: List[str]) -> None:
+        """
+        :param root: path to root folder
+        :param paths: list of image paths
+        """
+
+        self.root = root
+        self.paths = paths
+
+    @property
+    def labels(self) -> List[str]:
+        return sorted({os.path.basename(os.path.dirname(path)) for path in self.paths})
+
+    def folder_paths(self, root: str = None) -> List[str]:
+        """
+        :param root: optional, root folder of a copy of the corpus
+        :return: list of label folder paths
+        """
+
+        return [os.path.join(root or self.root, label) for label in self.labels]
+
+    def copy(self, dst: str) -> 'Corpus':
+        """
+        Copies corpus, so operations which modify images in place can be repeated on the same input
+
+        :param dst: path to new root folder. Deleted first if it exists
+        :return: Corpus object of the copy
+        """
+
+        if os.path.exists(dst):
+            shutil.rmtree(dst)
+        shutil.copytree(self.root, dst)
+
+        return Corpus(dst, [os.path.join(dst, os.path.relpath(path, self.root)) for path in self.paths])
+
+
+def _identity(rng: np.random.Generator) -> dict:
+    """
+    :return: dict of drawing parameters shared by all images of one synthetic person
+    """
+
+    return {
+        'skin': tuple(int(c) for c in rng.integers((150, 100, 70), (255, 210, 180))),
+        'hair': tuple(int(c) for c in rng.integers(0, 120, size=3)),
+        'eye_gap': rng.uniform(0.32, 0.42),
+        'face_ratio': rng.uniform(1.2, 1.45)
+    }
+
+
+def draw_face(rng: np.random.Generator, identity: dict, size: Tuple[int, int]) -> Image:
+    """
+    Draws a frontal cartoon face with eyes, nose and mouth on a noisy background.
+    Position, scale and in-plane rotation vary from image to image
+
+    :param rng: numpy random generator
+    :param identity: drawing parameters of the person
+    :param size: tuple of image width and height
+    :return: RGB PIL image
+    """
+
+    width, height = size
+    background = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(background).resize(size, Image.BILINEAR)
+
+    face_w = rng.uniform(0.3, 0.45) * min(size)
+    face_h = face_w * identity['face_ratio']
+    cx = rng.uniform(0.4, 0.6) * width
+    cy = rng.uniform(0.45, 0.55) * height
+
+    layer = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+
+    draw.ellipse((cx - face_w * 0.55, cy - face_h * 0.62, cx + face_w * 0.55, cy - face_h * 0.05), fill=identity['hair'])
+    draw.ellipse((cx - face_w / 2, cy - face_h / 2, cx + face_w / 2, cy + face_h / 2), fill=identity['skin'])
+
+    eye_y = cy - face_h * 0.1
+    eye_w, eye_h = face_w * 0.16, face_w * 0.08
+    for side in (-1, 1):
+        eye_x = cx + side * face_w * identity['eye_gap'] / 2 * 1.2
+        draw.ellipse((eye_x - eye_w / 2, eye_y - eye_h / 2, eye_x + eye_w / 2, eye_y + eye_h / 2), fill='white')
+        draw.ellipse((eye_x - eye_h / 2, eye_y - eye_h / 2, eye_x + eye_h / 2, eye_y + eye_h / 2), fill=(40, 30, 20))
+        draw.line((eye_x - eye_w / 2, eye_y - eye_h * 1.3, eye_x + eye_w / 2, eye_y - eye_h * 1.5),
+                  fill=identity['hair'], width=max(1, int(eye_h / 2)))
+
+    shade = tuple(int(c * 0.8) for c in identity['skin'])
+    draw.polygon([(cx, eye_y + eye_h), (cx - face_w * 0.07, cy + face_h * 0.12), (cx + face_w * 0.07, cy + face_h * 0.12)],
+                 fill=shade)
+    draw.chord((cx - face_w * 0.2, cy + face_h * 0.12, cx + face_w * 0.2, cy + face_h * 0.3), 0, 180, fill=(150, 40, 50))
+
+    layer = layer.rotate(rng.uniform(-20, 20), resample=Image.BICUBIC, center=(cx, cy))
+    img.paste(layer, mask=layer)
+
+    return img.filter(ImageFilter.GaussianBlur(radius=1))
+
+
+def generate_corpus(
+        root: str,
+        n_images: int,
+        n_labels: int = 4,
+        size: Tuple[int, int] = (640, 640),
+        seed: int = 0
+        ) -> Corpus:
+    """
+    Generates deterministic synthetic dataset, so benchmarks run offline on the same input every time.
+    Besides plain JPEG images it holds inputs for every cleaning step: every 10th image is a re-encoded
+    near-duplicate of the previous one, every 7th image is an RGBA PNG and every 5th image has a different size
+
+    :param root: path to root folder. Deleted first if it exists
+    :param n_images: number of images
+    :param n_labels: number of label folders(persons)
+    :param size: tuple of image width and height
+    :param seed: random seed
+    :return: Corpus object
+    """
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    rng = np.random.default_rng(seed)
+    identities = [_identity(rng) for _ in range(n_labels)]
+    paths = []
+    previous = None
+
+    for i in range(n_images):
+        duplicate = i % 10 == 9 and previous is not None
+        # near-duplicate is stored next to its original, so cleaning one folder finds it
+        label = (i - 1) % n_labels if duplicate else i % n_labels
+        folder = os.path.join(root, f'person_{label}')
+        os.makedirs(folder, exist_ok=True)
+
+        if duplicate:
+            img = previous
+        else:
+            img_size = size if i % 5 else (size[0] * 3 // 2, size[1] * 5 // 4)
+            img = draw_face(rng, identities[label], img_size)
+
+        if i % 7 == 6:
+            path = os.path.join(folder, f'{i:06d}.png')
+            img.convert('RGBA').save(path)
+        else:
+            path = os.path.join(folder, f'{i:06d}.jpg')
+            img.save(path, quality=75 if duplicate else 90)
+
+        paths.append(path)
+        previous = img
+
+    return Corpus(root, paths)
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+from .cases import Case
+
+
+def _read_status_kb(field: str) -> int:
+    """
+    :param field: field of /proc/self/status, e.g. VmRSS
+    :return: field value in kB
+    """
+
+    with open('/proc/self/status') as status_file:
+        for line in status_file:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+
+    raise KeyError(field)
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Resets peak resident memory(VmHWM) of the process. Works on Linux only
+
+    :return: whether peak was reset
+    """
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _run_with_peak_memory(case: Case) -> Tuple[float, float]:
+    """
+    Runs a case once. On Linux peak memory is the growth of resident memory during the run, so it covers memory
+    allocated by PIL and torch too. Elsewhere it falls back to tracemalloc, which sees only Python objects and numpy
+    arrays and slows code down
+
+    :param case: prepared benchmark case
+    :return: tuple of run time in seconds and peak memory in MB
+    """
+
+    case.prepare()
+
+    if _reset_peak_rss():
+        rss_before = _read_status_kb('VmRSS')
+        start = time.perf_counter()
+        case.run()
+        seconds = time.perf_counter() - start
+
+        return seconds, max(0, _read_status_kb('VmHWM') - rss_before) / 2 ** 10
+
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        case.run()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return seconds, peak / 2 ** 20
+
+
+def measure(case: Case, repeat: int = 3) -> dict:
+    """
+    Times a case and measures its peak memory. Time is the best and memory is the highest of repeat runs
+
+    :param case: prepared benchmark case
+    :param repeat: number of runs
+    :return: dict {'items', 'seconds', 'items_per_s', 'peak_mb'}
+    """
+
+    timings, peaks = zip(*(_run_with_peak_memory(case) for _ in range(repeat)))
+    seconds = min(timings)
+
+    return {
+        'items': case.items,
+        'seconds': seconds,
+        'items_per_s': case.items / seconds if seconds > 0 else float('inf'),
+        'peak_mb': max(peaks)
+    }
+
+
+def compare(
+        results: Dict[str, dict],
+        baseline: Dict[str, dict],
+        tolerance: float,
+        memory_slack_mb: float = 16
+        ) -> List[str]:
+    """
+    Finds benchmarks which got slower or use more memory than in baseline
+
+    :param results: dict of benchmark name -> measure output
+    :param baseline: results saved earlier
+    :param tolerance: allowed relative change, e.g. 0.2 allows 20% lower throughput and 20% higher peak memory
+    :param memory_slack_mb: peak memory growth below this is ignored, small peaks are dominated by allocator noise
+    :return: list of regression descriptions
+    """
+
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+
+        if result['items_per_s'] < expected['items_per_s'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput {result["items_per_s"]:.2f} items/s, '
+                               f'baseline {expected["items_per_s"]:.2f} items/s')
+
+        if result['peak_mb'] > max(expected['peak_mb'] * (1 + tolerance), expected['peak_mb'] + memory_slack_mb):
+            regressions.append(f'{name}: peak memory {result["peak_mb"]:.1f} MB, baseline {expected["peak_mb"]:.1f} MB')
+
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, dict]:
+    """
+    :param path: path to baseline .json file
+    :return: dict of benchmark name -> measure output, empty if there is no baseline yet
+    """
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as input_file:
+        return json.load(input_file)['results']
+
+
+def save_baseline(path: str, results: Dict[str, dict], machine: dict = None) -> None:
+    """
+    :param path: path to baseline .json file
+    :param results: dict of benchmark name -> measure output
+    :param machine: optional, description of the machine results were measured on
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with open(path, 'w') as output_file:
+        json.dump({'machine': machine, 'results': results}, output_file, indent=2, sort_keys=True)
+
+
+def format_results(results: Dict[str, dict], baseline: Dict[str, dict]) -> str:
+    """
+    :param results: dict of benchmark name -> measure output
+    :param baseline: results saved earlier, may be empty
+    :return: results as a text table, throughput change against baseline in the last column
+    """
+
+    width = max([len('benchmark')] + [len(name) for name in results])
+    lines = [f'{"benchmark":<{width}} {"items":>7} {"seconds":>9} {"items/s":>10} {"peak, MB":>9} {"vs base":>8}']
+
+    for name, result in results.items():
+        change = ''
+        if name in baseline:
+            change = f'{100 * (result["items_per_s"] / baseline[name]["items_per_s"] - 1):+.1f}%'
+
+        lines.append(f'{name:<{width}} {result["items"]:>7} {result["seconds"]:>9.3f} '
+                     f'{result["items_per_s"]:>10.2f} {result["peak_mb"]:>9.1f} {change:>8}')
+
+    return '\n'.join(lines)
@@ -0,0 +1,176 @@
+import argparse
+import warnings
+from typing import List
+
+from utils import profiling
+from utils.config import get_config
+from utils.logger import setup_logger
+
+config = get_config()
+logger = setup_logger(config['logger']['app_name'])
+
+# Subcommands import what they need inside their functions, so heavy dependencies(torch, sklearn, matplotlib)
+# are loaded only by the subcommands which use them and `--help` or fetching start quickly
+
+
+def fetch(args: argparse.Namespace) -> None:
+    """
+    Downloads images of given names, or of all names from config file
+    """
+
+    if args.extend:
+        from data.dataset import extend_dataset
+
+        extend_dataset(new_names=args.names, output_folder=args.output, img_number=args.limit)
+        return
+
+    from data.dataset import DatasetFetcher
+
+    fetcher = DatasetFetcher(
+        names=args.names or config['images']['labels'],
+        output_folder=args.output,
+        img_limit=args.limit,
+        delete_existing=args.delete_existing,
+        workers=args.workers
+        )
+
+    logger.info('Started fetching dataset')
+    fetcher.fetch_dataset()
+    logger.info('Finished fetching dataset')
+
+
+def clean(args: argparse.Namespace) -> None:
+    """
+    Converts, resizes and deduplicates dataset images and removes images without exactly one face
+    """
+
+    from data.dataset import DatasetCleaner
+
+    cleaner = DatasetCleaner(
+        root=args.root,
+        img_size=(config['images']['width'], config['images']['height']),
+        valid_extension=config['images']['extension'],
+        valid_format=config['images']['mode']
+        )
+
+    logger.info('Started cleaning dataset')
+    cleaner.clean_dataset()
+    logger.info('Finished cleaning dataset')
+
+
+def train(args: argparse.Namespace) -> None:
+    """
+    Builds gallery and nearest neighbor index from scratch or adds new images to them
+    """
+
+    from tools import train, update
+
+    logger.info('Started training')
+    if args.incremental:
+        update(root=args.root, labels=args.labels)
+    else:
+        train(root=args.root, load_embeddings=args.load_embeddings)
+    logger.info('Finished training')
+
+
+def infer(args: argparse.Namespace) -> None:
+    """
+    Finds the most similar rapper for every image in inference folder and plots results
+    """
+
+    from tools import filter_inference_images, inference
+    from utils import plot
+    from utils.models import warm_up
+
+    logger.info('Warming up models')
+    warm_up()
+
+    valid_input_imgs = filter_inference_images(args.folder)
+
+    logger.info(f'Got {len(valid_input_imgs)} images as input. Started inference')
+    pred_imgs, labels = inference(valid_input_imgs)
+    logger.info('Finished inference')
+
+    logger.info('Plotting results')
+    plot(valid_input_imgs, pred_imgs, labels)
+    logger.info('Results saved in a file result.png')
+
+
+def serve(args: argparse.Namespace) -> None:
+    """
+    Runs HTTP matching server
+    """
+
+    from tools.server import serve
+
+    serve(host=args.host, port=args.port)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    :return: argument parser with fetch, clean, train, infer and serve subcommands.
+     Defaults are taken from config file
+    """
+
+    parser = argparse.ArgumentParser(description='Find out what rapper you look like')
+    parser.add_argument('--profile', nargs='?', const=config['profiling']['trace_path'], metavar='TRACE_PATH',
+                        help='record time spent in pipeline stages, log summary and save Chrome trace')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help='download dataset images')
+    fetch_parser.add_argument('names', nargs='*', help='names to download, all names from config file by default')
+    fetch_parser.add_argument('--output', default=config['images']['root'], help='dataset root folder')
+    fetch_parser.add_argument('--limit', type=int, default=100, help='number of images per name')
+    fetch_parser.add_argument('--workers', type=int, default=config['fetch']['workers'],
+                              help='number of concurrent downloads')
+    fetch_parser.add_argument('--delete-existing', action='store_true', help='delete dataset root folder first')
+    fetch_parser.add_argument('--extend', action='store_true',
+                              help='add new names to config file and download only them')
+    fetch_parser.set_defaults(func=fetch)
+
+    clean_parser = subparsers.add_parser('clean', help='clean downloaded dataset')
+    clean_parser.add_argument('--root', default=config['images']['root'], help='dataset root folder')
+    clean_parser.set_defaults(func=clean)
+
+    train_parser = subparsers.add_parser('train', help='build gallery and nearest neighbor index')
+    train_parser.add_argument('--root', default=config['images']['root'], help='dataset root folder')
+    train_parser.add_argument('--incremental', action='store_true', default=config['train']['incremental'],
+                              help='only add images missing from the gallery')
+    train_parser.add_argument('--labels', nargs='+', help='with --incremental, only look for new images of these labels')
+    train_parser.add_argument('--load-embeddings', action='store_true', default=config['train']['load_embeddings'],
+                              help='reuse saved gallery instead of creating embeddings')
+    train_parser.set_defaults(func=train)
+
+    infer_parser = subparsers.add_parser('infer', help='match images from inference folder and plot results')
+    infer_parser.add_argument('--folder', default=config['inference']['images_folder'], help='folder with images')
+    infer_parser.set_defaults(func=infer)
+
+    serve_parser = subparsers.add_parser('serve', help='run HTTP matching server')
+    serve_parser.add_argument('--host', default=config['server']['host'])
+    serve_parser.add_argument('--port', type=int, default=config['server']['port'])
+    serve_parser.set_defaults(func=serve)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> None:
+    warnings.filterwarnings("ignore")
+
+    args = build_parser().parse_args(argv)
+    if args.command == 'fetch' and args.extend and not args.names:
+        raise SystemExit('fetch --extend requires names')
+
+    trace_path = args.profile or (config['profiling']['trace_path'] if config['profiling']['enabled'] else None)
+    profiling.enable(trace_path is not None)
+
+    try:
+        args.func(args)
+    finally:
+        if trace_path is not None:
+            logger.info(f'Stage timings:\n{profiling.format_summary()}')
+            profiling.save_trace(trace_path)
+            logger.info(f'Trace saved in a file {trace_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,10 @@
-from .cleaner import DatasetCleaner
-from .create_dataset import create_dataset
-from .extend_dataset import extend_dataset
-from .fetcher import DatasetFetcher
+from utils.lazy import lazy_exports
+
+__all__ = ['DatasetCleaner', 'DatasetManifest', 'create_dataset', 'extend_dataset', 'DatasetFetcher']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'DatasetCleaner': '.cleaner',
+    'DatasetManifest': '.manifest',
+    'create_dataset': '.create_dataset',
+    'extend_dataset': '.extend_dataset',
+    'DatasetFetcher': '.fetcher'
+})
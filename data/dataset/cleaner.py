@@ -1,18 +1,41 @@
+import multiprocessing
 import os
-from typing import Tuple, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Tuple, List
 
-import yaml
+import torch
 
+from embeddings import file_digest
 from face_processing import handle_face_number
 from utils import logger
+from utils.config import get_config
 from utils.img_utils import DuplicatesHandler
 from utils.img_utils import ImageBatchProcessor
+from utils.img_utils import PerceptualHashIndex
 from utils.img_utils import load_folder_paths
+from utils.models import get_registry
+from .manifest import CLEAN, DatasetManifest
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = logger.get_logger(config['logger']['app_name'], __name__)
 
 
+def _init_worker(num_threads: int) -> None:
+    """
+    Loads face detector once per worker process and limits its torch threads,
+    so workers don't oversubscribe CPU cores. Thread limit is applied directly,
+    registry configures torch only once per process
+
+    :param num_threads: number of torch threads per worker
+    """
+
+    torch.set_num_threads(num_threads)
+
+    registry = get_registry()
+    registry.num_threads = num_threads
+    _ = registry.detector
+
+
 class DatasetCleaner:
     """
     Class to clean downloaded dataset
@@ -50,23 +73,144 @@ class DatasetCleaner:
         :return: list of invalid images
         """
 
+        return self._clean_images(folder_path)[0]
+
+    def _clean_images(
+            self,
+            folder_path: str,
+            paths: List[str] = None,
+            known_hashes: List[int] = ()
+            ) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Cleans images of single folder, see clean_folder
+
+        :param folder_path: path to folder
+        :param paths: optional, list of images of the folder to clean. All images of the folder if not given
+        :param known_hashes: optional, average hashes of images of the folder which were cleaned earlier
+        :return: tuple of list of invalid images and dict of valid image path -> content digest
+        """
+
+        logger.info(f'Started cleaning {os.path.basename(os.path.normpath(folder_path))} folder')
+
         duplicates_handler = DuplicatesHandler(similarity=90)
         batch_processor = ImageBatchProcessor()
 
-        img_paths_batch = load_folder_paths(folder_path)
-        batch_processor.convert(img_paths_batch, mode=self.valid_format).resize(img_paths_batch, size=self.img_size)
+        img_paths_batch = batch_processor.transform(
+            load_folder_paths(folder_path) if paths is None else paths,
+            mode=self.valid_format,
+            size=self.img_size,
+            extension=self.valid_extension
+        )
+
+        invalid_imgs = set(handle_face_number(img_paths_batch))
+        invalid_imgs.update(duplicates_handler.handle(img_paths_batch, known_hashes))
+
+        digests = {path: file_digest(path) for path in img_paths_batch if path not in invalid_imgs}
+
+        return list(invalid_imgs), digests
+
+    def _settings(self) -> dict:
+        """
+        :return: dict of parameters which affect cleaning result
+        """
+
+        return {
+            'width': self.img_size[0],
+            'height': self.img_size[1],
+            'extension': self.valid_extension,
+            'format': self.valid_format
+        }
+
+    def clean_folders(
+            self,
+            folder_paths: List[str],
+            workers: int = None,
+            manifest: DatasetManifest = None
+            ) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Cleans many image folders, in parallel worker processes if more than one worker is requested.
+        If manifest is given, only images which are pending in it are cleaned: they are checked for duplicates
+        of each other and of images cleaned earlier, whose average hashes are taken from the perceptual hash index
+        after it is brought in line with the manifest, and valid ones are marked clean.
+        Folders without pending images are skipped
+
+        :param folder_paths: list of folder paths
+        :param workers: optional, number of worker processes. Defaults to the config value, 0 or 1 cleans serially
+        :param manifest: optional, updated dataset manifest
+        :return: iterator of tuples (folder path, list of invalid images) in folder_paths order
+        """
+
+        if manifest is None:
+            tasks = [(folder_path, None, ()) for folder_path in folder_paths]
+        else:
+            manifest.set_clean_settings(self._settings())
+
+            # clean images are indexed at the end of every cleaning run. Ones which are missing from the index
+            # (e.g. after an interrupted run) or whose size or modification time differ from the manifest are hashed
+            # here, so stale hashes are never used. The index is not saved, report_cross_label_duplicates does it
+            files = manifest.files()
+            hash_index = PerceptualHashIndex(path=config['dedup']['index_path'], root=self.root)
+            hash_index.update(files={path: files[path] for path in manifest.paths(status=CLEAN)})
+
+            tasks = []
+            for folder_path in folder_paths:
+                label = os.path.basename(os.path.normpath(folder_path))
+                pending = manifest.pending(label)
+                if pending:
+                    hashes = [hash_index.packed_hash(path) for path in manifest.paths(label=label, status=CLEAN)]
+                    tasks.append((folder_path, pending, hashes))
+
+        workers = config['clean']['workers'] if workers is None else workers
+        workers = min(workers, len(tasks))
+
+        if workers <= 1:
+            results = (self._clean_images(*task) for task in tasks)
+            yield from self._collect(folder_paths, tasks, results, manifest)
+            return
+
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        # forked workers would inherit torch and loader threads of the parent, which may deadlock them
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(num_threads,)
+        )
+        with executor:
+            results = executor.map(self._clean_images, *zip(*tasks))
+            yield from self._collect(folder_paths, tasks, results, manifest)
+
+    @staticmethod
+    def _collect(
+            folder_paths: List[str],
+            tasks: List[tuple],
+            results: Iterator[Tuple[List[str], Dict[str, str]]],
+            manifest: DatasetManifest = None
+            ) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Marks valid images clean in manifest and yields invalid images of every folder, none for skipped folders
+
+        :param folder_paths: list of folder paths
+        :param tasks: list of _clean_images arguments, one per cleaned folder in folder_paths order
+        :param results: iterator of _clean_images outputs in tasks order
+        :param manifest: optional, dataset manifest
+        :return: iterator of tuples (folder path, list of invalid images) in folder_paths order
+        """
+
+        cleaned_folders = {task[0] for task in tasks}
+        results = iter(results)
 
-        invalid_imgs = []
-        invalid_imgs.extend(handle_face_number(img_paths_batch))
-        invalid_imgs.extend(duplicates_handler.handle(img_paths_batch))
+        for folder_path in folder_paths:
+            if folder_path not in cleaned_folders:
+                yield folder_path, []
+                continue
 
-        invalid_imgs = list(set(invalid_imgs))
-        valid_img_paths = list(set(img_paths_batch) - set(invalid_imgs))
+            invalid_imgs, digests = next(results)
+            if manifest is not None:
+                for path, digest in digests.items():
+                    manifest.mark_clean(path, digest)
 
-        invalid_extension_imgs = batch_processor.filter_invalid_extensions(valid_img_paths,
-                                                                           config['images']['extension'])
-        batch_processor.change_extension(invalid_extension_imgs, self.valid_extension)
-        return invalid_imgs
+            yield folder_path, invalid_imgs
 
     def clean_dataset(self) -> None:
         """
@@ -75,16 +219,50 @@ class DatasetCleaner:
         - resize all images;
         - change all files extensions;
         - delete images where 0 or more than 1 people present;
-        - remove duplicate or very similar images
+        - remove duplicate or very similar images.
+        Only images added or changed since the previous run are cleaned, see DatasetManifest
         """
 
-        root = config['images']['root']
         batch_processor = ImageBatchProcessor()
 
-        for label in config['images']['labels']:
-            folder_path = os.path.join(root, label)
+        manifest = DatasetManifest(path=config['manifest']['path'], root=self.root)
+        added, changed, removed = manifest.update()
+        logger.info(f'Updated dataset manifest: {added} added, {changed} changed, {removed} removed images')
+
+        # the same folder must never be cleaned by two workers at once
+        labels = list(dict.fromkeys(config['images']['labels']))
+        folder_paths = [os.path.join(self.root, label) for label in labels]
 
-            logger.info(f'Started cleaning {label} folder')
-            invalid_imgs = self.clean_folder(folder_path)
+        logger.info(f'Started cleaning {len(labels)} folders')
+        for label, (_, invalid_imgs) in zip(labels, self.clean_folders(folder_paths, manifest=manifest)):
             batch_processor.delete(invalid_imgs)
             logger.info(f'Deleted {len(invalid_imgs)} images from {label} folder')
+
+        # drops deleted images and images renamed by cleaning
+        manifest.update()
+        manifest.save()
+        logger.info(f'Finished cleaning, {len(manifest.paths(status=CLEAN))} clean images')
+
+        self.report_cross_label_duplicates(manifest)
+
+    def report_cross_label_duplicates(self, manifest: DatasetManifest = None) -> List[Tuple[str, str, int]]:
+        """
+        Updates persistent perceptual hash index of the whole dataset and logs images
+        which are similar to images stored under other labels
+
+        :param manifest: optional, updated dataset manifest. Its file list is reused instead of scanning root again
+        :return: list of tuples (first image path, second image path, Hamming distance)
+        """
+
+        hash_index = PerceptualHashIndex(path=config['dedup']['index_path'], root=self.root)
+        added, changed, removed = hash_index.update(files=manifest.files() if manifest is not None else None)
+        hash_index.save()
+        logger.info(f'Updated perceptual hash index: {added} added, {changed} changed, {removed} removed images')
+
+        collisions = hash_index.cross_label_collisions(config['dedup']['distance'], kind=config['dedup']['kind'])
+        if len(collisions) != 0:
+            logger.warning(f'Found {len(collisions)} pairs of similar images under different labels')
+            for path1, path2, distance in collisions:
+                logger.debug(f'{path1} and {path2} are similar(distance {distance})')
+
+        return collisions
@@ -1,12 +1,10 @@
 from typing import List, Tuple
 
-import yaml
-
 from utils import logger
-from .cleaner import DatasetCleaner
+from utils.config import get_config
 from .fetcher import DatasetFetcher
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = logger.setup_logger(config['logger']['app_name'])
 
 
@@ -45,6 +43,9 @@ def create_dataset(
     logger.info('Finished fetching dataset')
 
     if clean:
+        # imported here, so fetching alone doesn't load face detection models and their dependencies
+        from .cleaner import DatasetCleaner
+
         cleaner = DatasetCleaner(
             root=output_folder,
             img_size=img_size,
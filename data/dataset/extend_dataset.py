@@ -3,12 +3,12 @@ from typing import List, Tuple
 
 import yaml
 
+from utils.config import CONFIG_PATH, get_config
 from utils.img_utils import ImageBatchProcessor
 from utils.logger import get_logger
-from .cleaner import DatasetCleaner
 from .fetcher import DatasetFetcher
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = get_logger(config['logger']['app_name'], __name__)
 
 
@@ -29,6 +29,10 @@ def _update_config(path: str, new_names: List[str]) -> None:
     with open(path, 'w') as cfg_file:
         cfg_file.write(yaml.dump(data, default_flow_style=False, sort_keys=False))
 
+    # keeps config shared by already imported modules in sync with the file
+    if path == CONFIG_PATH:
+        config['images']['labels'].extend(new_names)
+
 
 def extend_dataset(
         new_names: List[str],
@@ -51,7 +55,7 @@ def extend_dataset(
     :param valid_extension: valid image extension(JPG, PNG etc.)
     """
 
-    _update_config(path='config/config.yaml', new_names=new_names)
+    _update_config(path=CONFIG_PATH, new_names=new_names)
     logger.info('Updated config file with new names')
 
     fetcher = DatasetFetcher(
@@ -66,6 +70,10 @@ def extend_dataset(
     logger.info('Finished extending dataset')
 
     if clean:
+        # imported here, so fetching alone doesn't load face detection models and their dependencies
+        from .cleaner import DatasetCleaner
+        from .manifest import DatasetManifest
+
         cleaner = DatasetCleaner(
             root=output_folder,
             img_size=img_size,
@@ -76,10 +84,17 @@ def extend_dataset(
         folder_paths = list(map(lambda x: os.path.join(config['images']['root'], x), new_names))
         batch_processor = ImageBatchProcessor()
 
+        # new images are recorded as clean, so the next clean_dataset run skips them
+        manifest = DatasetManifest(path=config['manifest']['path'], root=config['images']['root'])
+        manifest.update()
+
         logger.info('Started cleaning extended dataset')
-        for i, folder_path in enumerate(folder_paths):
-            logger.info(f'Started cleaning {new_names[i]} folder')
-            invalid_imgs = cleaner.clean_folder(folder_path)
+        for name, (_, invalid_imgs) in zip(new_names, cleaner.clean_folders(folder_paths, manifest=manifest)):
             batch_processor.delete(invalid_imgs)
-            logger.info(f'Deleted {len(invalid_imgs)} images from {new_names[i]} folder')
+            logger.info(f'Deleted {len(invalid_imgs)} images from {name} folder')
+
+        manifest.update()
+        manifest.save()
+        # new images are indexed, so later cleaning runs compare images against them
+        cleaner.report_cross_label_duplicates(manifest)
         logger.info('Finished cleaning extended dataset')
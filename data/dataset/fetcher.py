@@ -1,17 +1,58 @@
+import json
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 
-import yaml
-from bing_image_downloader.downloader import download
+from PIL import Image
 
 from utils import logger
+from utils.config import get_config
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = logger.get_logger(config['logger']['app_name'], __name__)
 
 
+def bing_download(query: str, limit: int, output_dir: str) -> None:
+    """
+    Downloads images found by Bing into output_dir/query folder
+
+    :param query: search query
+    :param limit: number of images to download
+    :param output_dir: path to output folder
+    """
+
+    from bing_image_downloader.downloader import download
+
+    download(
+        query=query,
+        limit=limit,
+        adult_filter_off=False,
+        output_dir=output_dir,
+        filter='photo',
+        timeout=10,
+        verbose=False
+    )
+
+
+def _is_valid_image(path: str) -> bool:
+    """
+    Checks whether file is a readable image
+
+    :param path: path to file
+    :return: True if image can be opened and verified, False otherwise
+    """
+
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
 class DatasetFetcher:
     """
     Class to download rappers face images using Bing searcher
@@ -21,32 +62,100 @@ class DatasetFetcher:
             self,
             names: List[str],
             output_folder: str,
-            img_number: int,
-            delete_existing: bool
+            img_limit: int,
+            delete_existing: bool,
+            workers: int = None,
+            download_fn: Callable[[str, int, str], None] = bing_download,
+            checkpoint_path: str = None
             ) -> None:
         """
         :param names: list of rappers images of whom are to be downloaded
         :param output_folder: name of the root folder
-        :param img_number: number of images to download for each rapper
+        :param img_limit: number of images to download for each rapper
         :param delete_existing: whether to delete existing output_folder
+        :param workers: optional, number of names downloaded concurrently. Defaults to the config value
+        :param download_fn: function (query, limit, output_dir) which downloads images into output_dir/query folder
+        :param checkpoint_path: optional, path to checkpoint file. It is kept outside output_folder,
+         which may be deleted. Defaults to the config value
         """
 
         self.names = names
         self.output_folder = output_folder
-        self.img_limit = img_number
+        self.img_limit = img_limit
         self.delete_existing = delete_existing
+        self.workers = workers or config['fetch']['workers']
+        self.download_fn = download_fn
+        self.checkpoint_path = checkpoint_path or config['fetch']['checkpoint_path']
+
+        self._checkpoint_lock = threading.Lock()
 
     def fetch_dataset(self) -> None:
         """
-        Downloads images of rappers specified in the config file and saves them to output_folder
+        Downloads images of rappers specified in the config file and saves them to output_folder.
+        Names are downloaded concurrently. Every finished name is recorded in a checkpoint file,
+        so an interrupted fetch resumes with the names which are not finished yet
         """
 
         if self.delete_existing:
             self.delete_existing_dataset_folder()
 
-        for name in self.names:
+        os.makedirs(self.output_folder, exist_ok=True)
+
+        pending = [name for name in dict.fromkeys(self.names) if not self.is_fetched(name)]
+        logger.info(f'{len(self.names) - len(pending)} names already fetched, {len(pending)} left')
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for name, error in zip(pending, executor.map(self._fetch_name, pending)):
+                if error is not None:
+                    failed.append(name)
+                    logger.error(f'Failed to fetch {name} images: {error}')
+
+        if failed:
+            raise RuntimeError(f'Failed to fetch images of {failed}. Run fetching again to resume')
+
+    def _fetch_name(self, name: str) -> Exception:
+        """
+        Downloads images of one name and records it in the checkpoint
+
+        :param name: rapper name
+        :return: exception raised while downloading or None on success
+        """
+
+        try:
             self.download_batch(name)
-            logger.debug(f'Successfully fetched {name} images')
+        except Exception as e:
+            return e
+
+        self._mark_fetched(name)
+        logger.debug(f'Successfully fetched {name} images')
+
+        return None
+
+    def is_fetched(self, name: str) -> bool:
+        """
+        Checks whether images of the name were already fetched: either it is recorded in the checkpoint
+        and its folder still holds images or its folder already holds img_limit valid images.
+        Folder is renamed to name only after its download finished, so an existing folder is never partial.
+        Its number of images is not compared to img_limit for checkpointed names, cleaning deletes images
+
+        :param name: rapper name
+        :return: True if name doesn't need to be fetched, False otherwise
+        """
+
+        folder_path = os.path.join(self.output_folder, name)
+        if not os.path.isdir(folder_path):
+            return False
+
+        if name in self._read_checkpoint():
+            if any(entry.is_file() for entry in os.scandir(folder_path)):
+                return True
+
+            logger.warning(f'{name} is recorded as fetched but its folder is empty, fetching it again')
+            return False
+
+        n_valid = sum(_is_valid_image(entry.path) for entry in os.scandir(folder_path) if entry.is_file())
+        return n_valid >= self.img_limit
 
     def download_batch(self, name: str) -> None:
         """
@@ -56,21 +165,17 @@ class DatasetFetcher:
         """
 
         query = f'{name} rapper face'
-        download(
-            query=query,
-            limit=self.img_limit,
-            adult_filter_off=False,
-            output_dir=self.output_folder,
-            filter='photo',
-            timeout=10,
-            verbose=False
-        )
-
-        # downloaded folder's name is '{name} rapper face'
-        # so to rename it back to {name} we need to extract name from the query
-        folder_name = " ".join(query.split()[:-2])
         old_folder_path = os.path.join(self.output_folder, query)
-        new_folder_path = os.path.join(self.output_folder, folder_name)
+        new_folder_path = os.path.join(self.output_folder, name)
+
+        # leftovers of an interrupted download are replaced
+        for folder_path in (old_folder_path, new_folder_path):
+            if os.path.isdir(folder_path):
+                shutil.rmtree(folder_path)
+
+        self.download_fn(query, self.img_limit, self.output_folder)
+
+        # downloaded folder's name is '{name} rapper face', so it is renamed back to {name}
         os.rename(old_folder_path, new_folder_path)
 
     def delete_existing_dataset_folder(self) -> None:
@@ -86,3 +191,47 @@ class DatasetFetcher:
             shutil.rmtree(folder_path)
         else:
             logger.debug('Existing images folder not found. Creating it')
+
+        # checkpoint describes deleted folder
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _read_checkpoint(self) -> List[str]:
+        """
+        :return: list of names recorded as fetched
+        """
+
+        with self._checkpoint_lock:
+            return self._load_checkpoint()
+
+    def _mark_fetched(self, name: str) -> None:
+        """
+        Records name in the checkpoint file. File is rewritten atomically
+
+        :param name: rapper name
+        """
+
+        path = self.checkpoint_path
+
+        with self._checkpoint_lock:
+            fetched = list(dict.fromkeys(self._load_checkpoint() + [name]))
+
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(f'{path}.tmp', 'w') as output_file:
+                json.dump({'output_folder': self.output_folder, 'fetched': fetched}, output_file)
+            os.replace(f'{path}.tmp', path)
+
+    def _load_checkpoint(self) -> List[str]:
+        """
+        Reads checkpoint file. Must be called while holding the checkpoint lock
+
+        :return: list of names recorded as fetched, empty if checkpoint belongs to a different output folder
+        """
+
+        if not os.path.exists(self.checkpoint_path):
+            return []
+
+        with open(self.checkpoint_path) as input_file:
+            checkpoint = json.load(input_file)
+
+        return checkpoint['fetched'] if checkpoint.get('output_folder') == self.output_folder else []
@@ -0,0 +1,185 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from utils.img_utils import label_from_path, scan_dataset_files
+
+MANIFEST_VERSION = 1
+
+PENDING = 'pending'
+CLEAN = 'clean'
+
+
+class DatasetManifest:
+    """
+    Class to keep one record per dataset image on disk with change detection data: size, modification time
+    and content digest, and whether image passed cleaning. Records are refreshed with a directory scan diff,
+    so steps which consult the manifest only process images added or changed since their previous run.
+    Perceptual hashes of images are kept by PerceptualHashIndex, which reuses the manifest's scan
+    """
+
+    def __init__(self, path: str, root: str) -> None:
+        """
+        :param path: path to manifest file(.json)
+        :param root: path to dataset root folder with one folder per label
+        """
+
+        self.path = path
+        self.root = root
+
+        # image path -> {'size', 'mtime_ns', 'digest', 'status'}
+        self.records: Dict[str, dict] = {}
+        # cleaning parameters images marked clean were cleaned with
+        self.clean_settings: Optional[dict] = None
+
+        if os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        """
+        Reads manifest file. Manifests of a different version or dataset root are discarded
+        """
+
+        with open(self.path) as input_file:
+            data = json.load(input_file)
+
+        if data['version'] != MANIFEST_VERSION or data['root'] != self.root:
+            self.records, self.clean_settings = {}, None
+            return
+
+        self.records = data['records']
+        self.clean_settings = data['clean_settings']
+
+    def save(self) -> None:
+        """
+        Writes manifest file atomically
+        """
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        data = {
+            'version': MANIFEST_VERSION,
+            'root': self.root,
+            'clean_settings': self.clean_settings,
+            'records': self.records
+        }
+
+        with open(f'{self.path}.tmp', 'w') as output_file:
+            json.dump(data, output_file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def update(self) -> Tuple[int, int, int]:
+        """
+        Brings records in line with files on disk. Only directory entries are read: added and changed images
+        (different size or modification time) get fresh pending records, records of deleted images are dropped
+
+        :return: tuple of numbers of (added, changed, removed) images
+        """
+
+        files = scan_dataset_files(self.root)
+        added, changed = 0, 0
+
+        for path, (size, mtime_ns) in files.items():
+            record = self.records.get(path)
+            if record is not None and record['mtime_ns'] == mtime_ns and record['size'] == size:
+                continue
+
+            self.records[path] = self._new_record(size, mtime_ns)
+            if record is None:
+                added += 1
+            else:
+                changed += 1
+
+        removed = [path for path in self.records if path not in files]
+        for path in removed:
+            del self.records[path]
+
+        return added, changed, len(removed)
+
+    def paths(self, label: str = None, status: str = None) -> List[str]:
+        """
+        :param label: optional, label(folder name) of images
+        :param status: optional, clean status of images, one of: pending, clean
+        :return: sorted list of image paths
+        """
+
+        return sorted(
+            path for path, record in self.records.items()
+            if (label is None or label_from_path(path) == label) and (status is None or record['status'] == status)
+        )
+
+    def pending(self, label: str) -> List[str]:
+        """
+        :param label: label(folder name) of images
+        :return: sorted list of images of the label which were not cleaned yet
+        """
+
+        return [path for path in self.paths(label=label) if self.records[path]['status'] != CLEAN]
+
+    def files(self) -> Dict[str, Tuple[int, int]]:
+        """
+        :return: dict of image path -> tuple (size in bytes, modification time in nanoseconds)
+         as of the last update, see scan_dataset_files
+        """
+
+        return {path: (record['size'], record['mtime_ns']) for path, record in self.records.items()}
+
+    def digests(self, paths: List[str]) -> List[Optional[str]]:
+        """
+        :param paths: list of image paths
+        :return: list of content digests, None for images whose digest is unknown
+        """
+
+        return [self.records[path]['digest'] if path in self.records else None for path in paths]
+
+    def set_digest(self, path: str, digest: str) -> None:
+        """
+        Stores content digest of an unchanged image
+
+        :param path: image path
+        :param digest: SHA-256 hex digest of file contents
+        """
+
+        if path in self.records:
+            self.records[path]['digest'] = digest
+
+    def mark_clean(self, path: str, digest: str) -> None:
+        """
+        Records image which passed cleaning. File is stat-ed again, cleaning rewrites and may rename images
+
+        :param path: image path after cleaning
+        :param digest: SHA-256 hex digest of file contents after cleaning
+        """
+
+        stat = os.stat(path)
+        record = self._new_record(stat.st_size, stat.st_mtime_ns)
+        record.update(digest=digest, status=CLEAN)
+
+        self.records[path.replace('\\', '/')] = record
+
+    def set_clean_settings(self, settings: dict) -> bool:
+        """
+        Marks all images pending if they were cleaned with different parameters
+
+        :param settings: dict of cleaning parameters, e.g. image size and format
+        :return: whether parameters changed
+        """
+
+        if settings == self.clean_settings:
+            return False
+
+        for record in self.records.values():
+            record['status'] = PENDING
+        self.clean_settings = settings
+
+        return True
+
+    @staticmethod
+    def _new_record(size: int, mtime_ns: int) -> dict:
+        """
+        :param size: file size in bytes
+        :param mtime_ns: file modification time in nanoseconds
+        :return: pending record of an image nothing is known about besides file status
+        """
+
+        return {'size': size, 'mtime_ns': mtime_ns, 'digest': None, 'status': PENDING}
@@ -1 +1,17 @@
-from .get_embedding import get_embedding
+from utils.lazy import lazy_exports
+
+__all__ = [
+    'EmbeddingCache', 'file_digest', 'get_embedding', 'iter_embeddings',
+    'Gallery', 'GalleryWriter', 'append_gallery', 'load_gallery', 'save_gallery'
+]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'EmbeddingCache': '.cache',
+    'file_digest': '.cache',
+    'get_embedding': '.get_embedding',
+    'iter_embeddings': '.get_embedding',
+    'Gallery': '.store',
+    'GalleryWriter': '.store',
+    'append_gallery': '.store',
+    'load_gallery': '.store',
+    'save_gallery': '.store'
+})
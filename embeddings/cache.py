@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from face_processing.aligning import ALIGNMENT_VERSION
+from utils.models.registry import EMBEDDER_WEIGHTS
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes SHA-256 digest of file contents
+
+    :param path: path to file
+    :param chunk_size: number of bytes read at once
+    :return: hex digest
+    """
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def embedding_version() -> str:
+    """
+    :return: identifier of everything besides image contents that affects an embedding
+    """
+
+    return f'{EMBEDDER_WEIGHTS}-align{ALIGNMENT_VERSION}'
+
+
+class EmbeddingCache:
+    """
+    Class to store face embeddings on disk keyed by image content digest.
+    Embeddings of different model and alignment versions are kept apart, so changing either never serves stale rows
+    """
+
+    def __init__(self, root: str, version: str = None) -> None:
+        """
+        :param root: path to cache root folder
+        :param version: optional, embedding version. Defaults to the current model and alignment version
+        """
+
+        self.root = root
+        self.version = version or embedding_version()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Looks up an embedding
+
+        :param key: image content digest
+        :return: float32 numpy array of shape (512,) or None if embedding is not cached
+        """
+
+        try:
+            return np.load(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Looks up embeddings
+
+        :param keys: list of image content digests
+        :return: list of float32 numpy arrays or None for keys which are not cached
+        """
+
+        return [self.get(key) for key in keys]
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Stores an embedding. Write is atomic, so concurrent writers and crashes never leave partial files
+
+        :param key: image content digest
+        :param embedding: numpy array of shape (512,)
+        """
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # threads of one process may write the same key(e.g. duplicate images in one batch), so names differ by thread
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as output_file:
+            np.save(output_file, np.asarray(embedding, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def put_many(self, keys: List[str], embeddings: np.ndarray) -> None:
+        """
+        Stores embeddings
+
+        :param keys: list of image content digests
+        :param embeddings: numpy array of shape (len(keys), 512)
+        """
+
+        for key, embedding in zip(keys, embeddings):
+            self.put(key, embedding)
+
+    def _path(self, key: str) -> str:
+        """
+        :param key: image content digest
+        :return: path to embedding file. Files are sharded by the first two digest characters
+        """
+
+        return os.path.join(self.root, self.version, key[:2], f'{key}.npy')
@@ -1,26 +1,106 @@
-from typing import List
+from typing import Iterable, Iterator, List
 
 import numpy as np
+import torch
 from PIL import Image
-from facenet_pytorch import InceptionResnetV1
 from torchvision.transforms import ToTensor
 from tqdm.auto import tqdm
 
+from utils.config import get_config
+from utils.models import get_registry
+from utils.profiling import profiled
+from .cache import EmbeddingCache
 
-def get_embedding(imgs: List['Image']) -> np.ndarray:
+config = get_config()
+
+EMBEDDING_SIZE = 512
+
+
+@profiled('embed_batch', items='tensors')
+def _embed_batch(tensors: List[torch.Tensor]) -> np.ndarray:
+    """
+    Runs embedder over a batch of image tensors in one forward pass
+
+    :param tensors: list of image tensors of shape (C x H x W)
+    :return: float32 numpy array of shape (len(tensors), 512)
+    """
+
+    registry = get_registry()
+    batch = torch.stack(tensors).to(registry.device)
+
+    with torch.inference_mode():
+        batch_embeddings = registry.embedder(batch)
+
+    return batch_embeddings.cpu().numpy().astype(np.float32, copy=False)
+
+
+def iter_embeddings(imgs: Iterable['Image'], batch_size: int = None) -> Iterator[np.ndarray]:
+    """
+    Lazily creates 512-dimensional embeddings of given images batch by batch
+
+    :param imgs: iterable of PIL Images
+    :param batch_size: optional, number of images per embedder pass. Defaults to the config value
+    :return: iterator of float32 numpy arrays of shape (<= batch_size, 512)
+    """
+
+    batch_size = batch_size or config['models']['embedding_batch_size']
+    to_tensor = ToTensor()
+
+    batch = []
+    for img in imgs:
+        batch.append(to_tensor(img))
+
+        if len(batch) == batch_size:
+            yield _embed_batch(batch)
+            batch = []
+
+    if batch:
+        yield _embed_batch(batch)
+
+
+@profiled('get_embedding', items='imgs')
+def get_embedding(
+        imgs: List['Image'],
+        batch_size: int = None,
+        keys: List[str] = None,
+        cache: EmbeddingCache = None,
+        progress: bool = True
+        ) -> np.ndarray:
     """
     Creates a 512-dimensional embeddings of given image(s)
 
     :param imgs: list of PIL Images
-    :return: numpy array of 512-dimensional representations of given images
+    :param batch_size: optional, number of images per embedder pass. Defaults to the config value
+    :param keys: optional, content digests of source images in the same order as imgs. Used together with cache
+    :param cache: optional, embedding cache consulted before running embedder. Computed embeddings are stored in it
+    :param progress: whether to show progress bar
+    :return: float32 numpy array of 512-dimensional representations of given images
     """
 
-    resnet = InceptionResnetV1(pretrained='vggface2').eval()
-    embeddings = np.empty(shape=(1, 512))
+    batch_size = batch_size or config['models']['embedding_batch_size']
+    embeddings = np.empty(shape=(len(imgs), EMBEDDING_SIZE), dtype=np.float32)
+    use_cache = cache is not None and keys is not None
+
+    miss_indices = list(range(len(imgs)))
+    if use_cache:
+        miss_indices = []
+        for i, cached_embedding in enumerate(cache.get_many(keys)):
+            if cached_embedding is None:
+                miss_indices.append(i)
+            else:
+                embeddings[i] = cached_embedding
+
+    miss_imgs = (imgs[i] for i in miss_indices)
+
+    start = 0
+    n_batches = -(-len(miss_indices) // batch_size)
+    for batch_embeddings in tqdm(iter_embeddings(miss_imgs, batch_size), total=n_batches, disable=not progress):
+        rows = miss_indices[start:start + len(batch_embeddings)]
+        embeddings[rows] = batch_embeddings
+
+        if use_cache:
+            cache.put_many([keys[i] for i in rows], batch_embeddings)
 
-    for img in tqdm(imgs):
-        img_tensor = ToTensor()(img)
-        img_embedding = resnet(img_tensor.unsqueeze(0)).data
-        embeddings = np.vstack((embeddings, img_embedding))
+        start += len(batch_embeddings)
 
-    return embeddings[1:]
+    return embeddings
@@ -0,0 +1,280 @@
+import io
+import json
+import os
+import shutil
+from typing import List
+
+import numpy as np
+
+from .cache import embedding_version
+
+GALLERY_FORMAT_VERSION = 1
+
+
+class Gallery:
+    """
+    Class to hold embedding matrix together with path, label and content digest of every row
+    """
+
+    def __init__(self, embeddings: np.ndarray, paths: List[str], labels: List[str], digests: List[str]) -> None:
+        """
+        :param embeddings: float32 numpy array (or read-only memmap) of shape (n_rows, 512)
+        :param paths: list of image paths, one per row
+        :param labels: list of image labels, one per row
+        :param digests: list of image content digests, one per row
+        """
+
+        if not len(embeddings) == len(paths) == len(labels) == len(digests):
+            raise ValueError(f'Gallery has {len(embeddings)} embeddings but {len(paths)} paths, '
+                             f'{len(labels)} labels and {len(digests)} digests')
+
+        self.embeddings = embeddings
+        self.paths = paths
+        self.labels = labels
+        self.digests = digests
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+def _manifest_path(path: str) -> str:
+    """
+    :param path: path to embedding matrix file
+    :return: path to its sidecar manifest
+    """
+
+    return f'{os.path.splitext(path)[0]}.json'
+
+
+def _write_manifest(path: str, paths: List[str], labels: List[str], digests: List[str], dim: int) -> None:
+    """
+    Writes sidecar manifest of embedding matrix to a temporary file next to it
+
+    :param path: path to embedding matrix file(.npy)
+    :param paths: list of image paths, one per row
+    :param labels: list of image labels, one per row
+    :param digests: list of image content digests, one per row
+    :param dim: embedding dimension
+    """
+
+    manifest = {
+        'format_version': GALLERY_FORMAT_VERSION,
+        'embedding_version': embedding_version(),
+        'shape': [len(paths), dim],
+        'dtype': 'float32',
+        'rows': [{'path': p, 'label': l, 'digest': d} for p, l, d in zip(paths, labels, digests)]
+    }
+
+    with open(f'{_manifest_path(path)}.tmp', 'w') as output_file:
+        json.dump(manifest, output_file)
+
+
+def _commit(path: str) -> None:
+    """
+    Moves temporary embedding matrix and manifest files in place
+
+    :param path: path to embedding matrix file(.npy)
+    """
+
+    manifest_path = _manifest_path(path)
+
+    os.replace(f'{path}.tmp', path)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+
+def save_gallery(path: str, gallery: Gallery) -> None:
+    """
+    Saves gallery as a raw float32 .npy matrix and a sidecar .json manifest next to it.
+    Both files are written to temporary files first and then moved in place
+
+    :param path: path to embedding matrix file(.npy)
+    :param gallery: Gallery object
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with open(f'{path}.tmp', 'wb') as output_file:
+        np.save(output_file, np.ascontiguousarray(gallery.embeddings, dtype=np.float32))
+    _write_manifest(path, gallery.paths, gallery.labels, gallery.digests, int(gallery.embeddings.shape[1]))
+
+    _commit(path)
+
+
+class GalleryWriter:
+    """
+    Class to write gallery row by row without holding the embedding matrix in memory.
+    Rows are appended to a raw scratch file and turned into .npy matrix and manifest on close
+    """
+
+    def __init__(self, path: str, dim: int = 512) -> None:
+        """
+        :param path: path to embedding matrix file(.npy)
+        :param dim: embedding dimension
+        """
+
+        self.path = path
+        self.dim = dim
+
+        self.paths, self.labels, self.digests = [], [], []
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._rows_path = f'{path}.rows.tmp'
+        self._rows_file = open(self._rows_path, 'wb')
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def append(self, embeddings: np.ndarray, paths: List[str], labels: List[str], digests: List[str]) -> None:
+        """
+        Appends rows
+
+        :param embeddings: numpy array of shape (n_rows, dim)
+        :param paths: list of image paths, one per row
+        :param labels: list of image labels, one per row
+        :param digests: list of image content digests, one per row
+        """
+
+        self._rows_file.write(np.ascontiguousarray(embeddings, dtype='<f4').tobytes())
+
+        self.paths.extend(paths)
+        self.labels.extend(labels)
+        self.digests.extend(digests)
+
+    def close(self) -> None:
+        """
+        Writes .npy header followed by appended rows, writes manifest and moves both files in place
+        """
+
+        self._rows_file.close()
+        header = {'descr': '<f4', 'fortran_order': False, 'shape': (len(self), self.dim)}
+
+        with open(f'{self.path}.tmp', 'wb') as output_file, open(self._rows_path, 'rb') as rows_file:
+            np.lib.format.write_array_header_1_0(output_file, header)
+            shutil.copyfileobj(rows_file, output_file)
+        _write_manifest(self.path, self.paths, self.labels, self.digests, self.dim)
+
+        _commit(self.path)
+        os.remove(self._rows_path)
+
+    def __enter__(self) -> 'GalleryWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._rows_file.close()
+            os.remove(self._rows_path)
+
+
+def _read_data_offset(input_file) -> int:
+    """
+    :param input_file: .npy file opened in binary mode
+    :return: offset of the first data byte, i.e. length of .npy header
+    """
+
+    major, _ = np.lib.format.read_magic(input_file)
+    if major == 1:
+        np.lib.format.read_array_header_1_0(input_file)
+    else:
+        np.lib.format.read_array_header_2_0(input_file)
+
+    return input_file.tell()
+
+
+def append_gallery(
+        path: str,
+        embeddings: np.ndarray,
+        paths: List[str],
+        labels: List[str],
+        digests: List[str]
+        ) -> None:
+    """
+    Appends rows to gallery saved with save_gallery. Only new rows are written: they go to the end of
+    the embedding matrix file and .npy header is rewritten in place. The whole file is rewritten only
+    if new header doesn't fit in the old one, which happens only when shape gets much more digits.
+    In-place append is not atomic: if it is interrupted after the header is rewritten and before the manifest
+    is replaced, header and manifest disagree, load_gallery raises and the gallery has to be rebuilt with train
+
+    :param path: path to embedding matrix file(.npy)
+    :param embeddings: numpy array of shape (n_new_rows, dim)
+    :param paths: list of image paths, one per new row
+    :param labels: list of image labels, one per new row
+    :param digests: list of image content digests, one per new row
+    """
+
+    gallery = load_gallery(path)
+    n_rows, dim = gallery.embeddings.shape
+    data_size = n_rows * dim * 4
+
+    embeddings = np.ascontiguousarray(embeddings, dtype='<f4').reshape(-1, dim)
+    if not len(embeddings) == len(paths) == len(labels) == len(digests):
+        raise ValueError(f'Got {len(embeddings)} embeddings but {len(paths)} paths, '
+                         f'{len(labels)} labels and {len(digests)} digests')
+
+    header_buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header_buffer, {'descr': '<f4', 'fortran_order': False, 'shape': (n_rows + len(embeddings), dim)}
+        )
+    header = header_buffer.getvalue()
+
+    with open(path, 'r+b') as gallery_file:
+        data_offset = _read_data_offset(gallery_file)
+        in_place = len(header) == data_offset
+
+        if in_place:
+            # rows left over by an append interrupted before its header was written are dropped here
+            gallery_file.truncate(data_offset + data_size)
+            gallery_file.seek(0, os.SEEK_END)
+            gallery_file.write(embeddings.tobytes())
+            gallery_file.flush()
+
+            gallery_file.seek(0)
+            gallery_file.write(header)
+        else:
+            with open(f'{path}.tmp', 'wb') as output_file:
+                output_file.write(header)
+                gallery_file.seek(data_offset)
+                for start in range(0, data_size, 1 << 24):
+                    output_file.write(gallery_file.read(min(1 << 24, data_size - start)))
+                output_file.write(embeddings.tobytes())
+
+    _write_manifest(path, gallery.paths + list(paths), gallery.labels + list(labels),
+                    gallery.digests + list(digests), dim)
+
+    if in_place:
+        manifest_path = _manifest_path(path)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+    else:
+        _commit(path)
+
+
+def load_gallery(path: str, mmap: bool = True) -> Gallery:
+    """
+    Loads gallery saved with save_gallery
+
+    :param path: path to embedding matrix file(.npy)
+    :param mmap: whether to memory-map embedding matrix read-only instead of reading it into memory
+    :return: Gallery object
+    """
+
+    with open(_manifest_path(path)) as input_file:
+        manifest = json.load(input_file)
+
+    if manifest['format_version'] != GALLERY_FORMAT_VERSION:
+        raise ValueError(f'Unsupported gallery format version {manifest["format_version"]}, '
+                         f'expected {GALLERY_FORMAT_VERSION}')
+
+    embeddings = np.load(path, mmap_mode='r' if mmap else None)
+    if list(embeddings.shape) != manifest['shape']:
+        raise ValueError(f'Embedding matrix shape {embeddings.shape} does not match manifest shape {manifest["shape"]}. '
+                         f'Call train to rebuild the gallery')
+
+    rows = manifest['rows']
+
+    return Gallery(
+        embeddings=embeddings,
+        paths=[row['path'] for row in rows],
+        labels=[row['label'] for row in rows],
+        digests=[row['digest'] for row in rows]
+    )
@@ -1,2 +1,17 @@
-from .counting import handle_face_number
-from .extraction import extract_face
+from utils.lazy import lazy_exports
+
+__all__ = [
+    'align_face', 'handle_face_number', 'FaceAnalysis', 'analyze_faces', 'detect_faces',
+    'iter_face_analyses', 'crop_face', 'crop_faces', 'extract_face'
+]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'align_face': '.aligning',
+    'handle_face_number': '.counting',
+    'FaceAnalysis': '.detection',
+    'analyze_faces': '.detection',
+    'detect_faces': '.detection',
+    'iter_face_analyses': '.detection',
+    'crop_face': '.extraction',
+    'crop_faces': '.extraction',
+    'extract_face': '.extraction'
+})
@@ -1,34 +1,154 @@
+from typing import Union
+
 import numpy as np
 from PIL import Image
 
-from .detection import get_bboxes
+from utils.img_utils.loader import get_loader
+from utils.profiling import profiled
+from .detection import FaceAnalysis, analyze_faces
+
+# bump whenever alignment or cropping changes, so cached embeddings of old crops are not reused
+ALIGNMENT_VERSION = 2
+
+CROP_SIZE = 160
 
 
-def align_face(path: str) -> Image:
+def rotation_angles(landmarks: np.ndarray) -> np.ndarray:
     """
-    Rotates on image so that eyes are located on a horizontal line
+    Computes counter-clockwise rotation angles which put eyes on a horizontal line, for many faces at once
 
-    :param path: path to image
-    :return: PIL image with aligned face
+    :param landmarks: numpy array of shape (n_faces, 5, 2) with landmarks of every face
+    :return: numpy array of shape (n_faces,) with rotation angles in degrees
+    """
+
+    landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, 5, 2)
+    eyes_vector = landmarks[:, 1] - landmarks[:, 0]
+
+    return np.rad2deg(np.arctan2(eyes_vector[:, 1], eyes_vector[:, 0]))
+
+
+def rotation_angle(landmarks: np.ndarray) -> float:
+    """
+    Computes counter-clockwise rotation angle which puts eyes on a horizontal line
+
+    :param landmarks: numpy array of shape (5, 2) with landmarks of a single face
+    :return: rotation angle in degrees
+    """
+
+    return float(rotation_angles(landmarks)[0])
+
+
+def alignment_transforms(landmarks: np.ndarray, boxes: np.ndarray, size: int = CROP_SIZE) -> np.ndarray:
+    """
+    Computes affine transforms from aligned face crop to image coordinates for many faces at once.
+    Crop is the bounding box rotated around its center by the eyes angle and scaled to size x size,
+    which is the same framing as rotating the whole image, cropping the box and resizing it
+
+    :param landmarks: numpy array of shape (n_faces, 5, 2) with landmarks of every face
+    :param boxes: numpy array of shape (n_faces, 4) with [x1, y1, x2, y2] bounding box of every face
+    :param size: side of square crop
+    :return: numpy array of shape (n_faces, 2, 3): image point = transform @ [crop_x, crop_y, 1]
+    """
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    theta = np.deg2rad(rotation_angles(landmarks))
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+
+    scale_x = (boxes[:, 2] - boxes[:, 0]) / size
+    scale_y = (boxes[:, 3] - boxes[:, 1]) / size
+
+    transforms = np.empty(shape=(len(boxes), 2, 3))
+    transforms[:, 0, 0] = cos_theta * scale_x
+    transforms[:, 0, 1] = -sin_theta * scale_y
+    transforms[:, 1, 0] = sin_theta * scale_x
+    transforms[:, 1, 1] = cos_theta * scale_y
+
+    # crop center is mapped onto box center
+    box_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    transforms[:, :, 2] = box_centers - transforms[:, :, :2] @ np.array([size / 2, size / 2])
+
+    return transforms
+
+
+def _bilinear_sample(pixels: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Samples image at fractional pixel positions. Positions outside the image are black
+
+    :param pixels: numpy array of shape (height, width, channels)
+    :param xs: numpy array of x positions, pixel centers are at integer positions
+    :param ys: numpy array of y positions of the same shape as xs
+    :return: float32 numpy array of shape xs.shape + (channels,)
+    """
+
+    height, width = pixels.shape[:2]
+    x0, y0 = np.floor(xs), np.floor(ys)
+    fx, fy = (xs - x0).astype(np.float32), (ys - y0).astype(np.float32)
+    x0, y0 = x0.astype(np.int64), y0.astype(np.int64)
+
+    result = np.zeros(shape=xs.shape + pixels.shape[2:], dtype=np.float32)
+
+    for dy, weight_y in ((0, 1 - fy), (1, fy)):
+        for dx, weight_x in ((0, 1 - fx), (1, fx)):
+            x, y = x0 + dx, y0 + dy
+            inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+
+            weight = weight_x * weight_y * inside
+            result += weight[..., None] * pixels[np.clip(y, 0, height - 1), np.clip(x, 0, width - 1)]
+
+    return result
+
+
+def warp_face(img: 'Image', transform: np.ndarray, size: int = CROP_SIZE) -> 'Image':
     """
+    Produces aligned face crop in a single warp: every crop pixel is sampled bilinearly from the image.
+    Only the image region under the crop is converted to an array, and it is first downscaled by an integer
+    factor when the face is much larger than the crop, so the warp doesn't alias
 
-    img = Image.open(path)
+    :param img: RGB PIL image
+    :param transform: numpy array of shape (2, 3) from alignment_transforms
+    :param size: side of square crop
+    :return: RGB PIL image of size size x size
+    """
+
+    corners = transform @ np.array([[0, size, 0, size], [0, 0, size, size], [1, 1, 1, 1]])
+    left, top = np.maximum(np.floor(corners.min(axis=1)).astype(int) - 1, 0)
+    right, bottom = np.minimum(np.ceil(corners.max(axis=1)).astype(int) + 1, img.size)
+
+    if right <= left or bottom <= top:
+        return Image.new('RGB', (size, size))
+
+    region = img.crop((left, top, right, bottom))
+
+    # number of image pixels per crop pixel along the shorter crop axis
+    step = max(1, int(np.linalg.norm(transform[:, :2], axis=0).min()))
+    if step > 1:
+        region = region.reduce(step)
+
+    # crop pixel centers, mapped to region pixel positions
+    grid = np.arange(size) + 0.5
+    crop_x, crop_y = np.meshgrid(grid, grid)
+    xs = (transform[0, 0] * crop_x + transform[0, 1] * crop_y + transform[0, 2] - left) / step - 0.5
+    ys = (transform[1, 0] * crop_x + transform[1, 1] * crop_y + transform[1, 2] - top) / step - 0.5
 
-    _, landmarks = get_bboxes(img, landmarks=True)
-    right_eye, left_eye = landmarks[0], landmarks[1]
+    pixels = _bilinear_sample(np.asarray(region), xs, ys)
 
-    x1, y1 = right_eye
-    x2, y2 = left_eye
+    return Image.fromarray(np.clip(np.rint(pixels), 0, 255).astype(np.uint8))
 
-    a, b = y1 - y2, x2 - x1
-    c = np.sqrt(a**2 + b**2)
 
-    cos_alpha = (b**2 + c**2 - a**2) / (2 * b * c)
-    alpha = np.rad2deg(np.arccos(cos_alpha))
+@profiled('align_face')
+def align_face(path: Union['Image', str], analysis: FaceAnalysis = None) -> Image:
+    """
+    Rotates on image so that eyes are located on a horizontal line
+
+    :param path: one of: path to image, PIL image object
+    :param analysis: optional, cached detection result for this image. If not given, faces are detected
+    :return: PIL image with aligned face
+    """
+
+    if analysis is None:
+        analysis = analyze_faces(path)
 
-    if y1 < y2:
-        aligned_img = img.rotate(alpha)
-    else:
-        aligned_img = img.rotate(360 - alpha)
+    img = analysis.image if analysis.image is not None else get_loader().load(path)
+    aligned_img = img.rotate(rotation_angle(analysis.landmarks[0]))
 
     return aligned_img
@@ -1,34 +1,45 @@
 from typing import List
 
-from .extraction import get_bboxes
+from .detection import FaceAnalysis, analyze_faces, detect_faces
 
 
-def num_faces_on_image(path: str) -> int:
+def num_faces_on_image(path: str, analysis: FaceAnalysis = None) -> int:
     """
     Detects number of faces(bounding boxes) on the image
 
     :param path: path to image
+    :param analysis: optional, cached detection result for this image. If not given, faces are detected
     :return: number of detected faces(bounding boxes)
     """
 
-    bboxes = get_bboxes(path)[0]
+    if analysis is None:
+        analysis = analyze_faces(path)
 
-    return len(bboxes) if bboxes is not None else 0
+    return analysis.num_faces
 
 
-def handle_face_number(paths: List[str], faces_allowed: int = 1) -> List[str]:
+def handle_face_number(
+        paths: List[str],
+        faces_allowed: int = 1,
+        analyses: List[FaceAnalysis] = None
+        ) -> List[str]:
     """
     Finds images on which number of faces is different from faces_allowed parameter
 
     :param paths: list of images paths
     :param faces_allowed: number of faces allowed on the photo
+    :param analyses: optional, list of cached detection results in the same order as paths.
+     If not given, faces are detected in batches
     :return: list of paths to images on which number of faces is different from face_allowed parameter
     """
 
+    if analyses is None:
+        analyses = detect_faces(paths)
+
     invalid_imgs = []
 
-    for path in paths:
-        if num_faces_on_image(path) != faces_allowed:
+    for path, analysis in zip(paths, analyses):
+        if num_faces_on_image(path, analysis) != faces_allowed:
             invalid_imgs.append(path)
 
     return invalid_imgs
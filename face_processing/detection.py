@@ -1,10 +1,179 @@
-from typing import Tuple, Union
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 from PIL import Image
-from facenet_pytorch import MTCNN
 
+from utils.config import get_config
+from utils.img_utils.loader import get_loader
+from utils.models import get_detector
+from utils.profiling import profiled, stage
 
+config = get_config()
+
+
+class FaceAnalysis:
+    """
+    Class to hold result of a single face detection pass over an image
+    """
+
+    def __init__(
+            self,
+            boxes: Optional[np.ndarray],
+            probs: Optional[np.ndarray],
+            landmarks: Optional[np.ndarray],
+            image: 'Image' = None
+            ) -> None:
+        """
+        :param boxes: numpy array of shape (n_faces, 4) with bounding box coordinates or None if no faces found
+        :param probs: numpy array of shape (n_faces,) with detection probabilities or None if no faces found
+        :param landmarks: numpy array of shape (n_faces, 5, 2) with face landmarks or None if no faces found
+        :param image: optional, PIL image detection was run on
+        """
+
+        self.boxes = boxes
+        self.probs = probs
+        self.landmarks = landmarks
+        self.image = image
+
+    @property
+    def num_faces(self) -> int:
+        """
+        :return: number of detected faces(bounding boxes)
+        """
+
+        return len(self.boxes) if self.boxes is not None else 0
+
+
+@profiled('decode')
+def _open_rgb(img: Union['Image', str]) -> 'Image':
+    """
+    Opens an image through the shared loader if path is given and converts it to RGB format
+
+    :param img: one of: path to image, PIL image object
+    :return: PIL image in RGB format
+    """
+
+    if isinstance(img, str):
+        return get_loader().load(img)
+
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def _to_analysis(boxes: np.ndarray, probs: np.ndarray, landmarks: np.ndarray, image: 'Image' = None) -> FaceAnalysis:
+    """
+    Creates FaceAnalysis from MTCNN output for a single image.
+    MTCNN reports probabilities as [None] when no faces found, they are normalised to None
+
+    :param boxes: bounding boxes of a single image or None
+    :param probs: detection probabilities of a single image
+    :param landmarks: face landmarks of a single image or None
+    :param image: optional, PIL image detection was run on
+    :return: FaceAnalysis object
+    """
+
+    if boxes is None:
+        return FaceAnalysis(boxes=None, probs=None, landmarks=None, image=image)
+
+    return FaceAnalysis(boxes=boxes, probs=probs, landmarks=landmarks, image=image)
+
+
+@profiled('analyze_faces')
+def analyze_faces(img: Union['Image', str]) -> FaceAnalysis:
+    """
+    Detects faces, their probabilities and landmarks on image in one detector pass
+
+    :param img: one of: path to image, PIL image object
+    :return: FaceAnalysis object which also keeps the RGB image detection was run on
+    """
+
+    img = _open_rgb(img)
+    boxes, probs, landmarks = get_detector().detect(img, landmarks=True)
+
+    return _to_analysis(boxes, probs, landmarks, image=img)
+
+
+def _detect_bucket(
+        bucket: List[Tuple[int, 'Image']],
+        analyses: List[Optional[FaceAnalysis]],
+        keep_images: bool
+        ) -> None:
+    """
+    Runs detector over equally sized images in one forward pass and stores results by their original index
+
+    :param bucket: list of tuples (index, PIL image) where all images have the same size
+    :param analyses: list where results are stored
+    :param keep_images: whether to keep images in results
+    """
+
+    indices, imgs = zip(*bucket)
+    with stage('mtcnn', items=len(imgs)):
+        batch_boxes, batch_probs, batch_landmarks = get_detector().detect(list(imgs), landmarks=True)
+
+    for index, img, boxes, probs, landmarks in zip(indices, imgs, batch_boxes, batch_probs, batch_landmarks):
+        analyses[index] = _to_analysis(boxes, probs, landmarks, image=img if keep_images else None)
+
+
+@profiled('detect_faces')
+def detect_faces(
+        imgs: Iterable[Union['Image', str]],
+        batch_size: int = None,
+        keep_images: bool = False
+        ) -> List[FaceAnalysis]:
+    """
+    Detects faces, their probabilities and landmarks on many images, running detector over batches of images.
+    MTCNN can only stack equally sized images, so images are grouped by resolution and every group
+    is sent to the detector as soon as it holds batch_size images. Images are decoded on the shared loader
+    ahead of the detector
+
+    :param imgs: iterable of: paths to images, PIL image objects
+    :param batch_size: optional, maximal number of images per detector pass. Defaults to the config value
+    :param keep_images: whether to keep RGB images in results
+    :return: list of FaceAnalysis objects in the same order as imgs
+    """
+
+    batch_size = batch_size or config['models']['detection_batch_size']
+
+    analyses = []
+    buckets: Dict[Tuple[int, int], List[Tuple[int, 'Image']]] = {}
+
+    for index, img in enumerate(get_loader().imap(imgs)):
+        analyses.append(None)
+
+        bucket = buckets.setdefault(img.size, [])
+        bucket.append((index, img))
+
+        if len(bucket) == batch_size:
+            _detect_bucket(bucket, analyses, keep_images)
+            bucket.clear()
+
+    for bucket in buckets.values():
+        if bucket:
+            _detect_bucket(bucket, analyses, keep_images)
+
+    return analyses
+
+
+def iter_face_analyses(paths: List[str], batch_size: int = None) -> Iterator[Tuple[str, FaceAnalysis]]:
+    """
+    Lazily detects faces on images chunk by chunk, so only one chunk of decoded images is held in memory.
+    Images of the next chunk are decoded while detector runs over the current one
+
+    :param paths: list of image paths
+    :param batch_size: optional, number of images per chunk. Defaults to the config value
+    :return: iterator of tuples (path, FaceAnalysis with RGB image kept)
+    """
+
+    batch_size = batch_size or config['models']['detection_batch_size']
+
+    imgs = get_loader().imap(paths)
+
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        yield from zip(chunk, detect_faces(islice(imgs, len(chunk)), batch_size=batch_size, keep_images=True))
+
+
+@profiled('get_bboxes')
 def get_bboxes(img: Union['Image', str], landmarks: bool = False) -> Tuple[np.ndarray, np.ndarray]:
     """
     Extracts face and, if specified, face landmarks from image
@@ -14,10 +183,8 @@ def get_bboxes(img: Union['Image', str], landmarks: bool = False) -> Tuple[np.nd
     :return: tuple of numpy array with bounding box coordinates and numpy array of face landmarks
     """
 
-    if isinstance(img, str):
-        img = Image.open(img).convert('RGB')
-
-    extractor = MTCNN()
+    img = _open_rgb(img)
+    extractor = get_detector()
 
     response = extractor.detect(img, landmarks=landmarks)
     bboxes = response[0]
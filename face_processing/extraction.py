@@ -1,35 +1,69 @@
 from typing import List, Tuple
 
+import numpy as np
 from PIL import Image
 
-from .aligning import align_face
-from .detection import get_bboxes
+from utils.img_utils.loader import get_loader
+from utils.profiling import profiled
+from .aligning import alignment_transforms, warp_face
+from .detection import FaceAnalysis, iter_face_analyses
 
 
-def extract_face(paths: List[str]) -> Tuple[List['Image'], List[str]]:
+@profiled('crop_faces', items='analyses')
+def crop_faces(analyses: List[FaceAnalysis]) -> List['Image']:
+    """
+    Aligns and crops the first detected face of every image. Transforms of all faces are computed at once
+    and every crop is produced by a single affine warp, so images are never rotated as a whole
+
+    :param analyses: list of detection results with RGB images kept and at least one face found
+    :return: list of PIL face images of size 160x160
+    """
+
+    if len(analyses) == 0:
+        return []
+
+    transforms = alignment_transforms(
+        landmarks=np.stack([analysis.landmarks[0] for analysis in analyses]),
+        boxes=np.stack([analysis.boxes[0] for analysis in analyses])
+    )
+
+    return [warp_face(analysis.image, transform) for analysis, transform in zip(analyses, transforms)]
+
+
+def crop_face(analysis: FaceAnalysis) -> 'Image':
+    """
+    Aligns the first detected face and crops it
+
+    :param analysis: detection result with RGB image kept and at least one face found
+    :return: PIL face image of size 160x160
+    """
+
+    return crop_faces([analysis])[0]
+
+
+@profiled('extract_face', items='paths')
+def extract_face(paths: List[str], analyses: List[FaceAnalysis] = None) -> Tuple[List['Image'], List[str]]:
     """
     Extracts face from the image where only 1 person present
 
     :param paths: list of image paths
+    :param analyses: optional, list of cached detection results in the same order as paths.
+     If not given, faces are detected in batches
     :return: list of PIL face images and list of invalid images(images from which neural network couldn't extract faces)
     """
 
     faces, invalid_imgs = [], []
+    path_analyses = zip(paths, analyses) if analyses is not None else iter_face_analyses(paths)
 
-    for path in paths:
-        aligned_img = align_face(path)
-
-        try:
-            bbox = get_bboxes(aligned_img)[0][0]
-        except TypeError:
+    for path, analysis in path_analyses:
+        if analysis.num_faces == 0:
             invalid_imgs.append(path)
             continue
 
-        face = aligned_img.crop(bbox).resize((160, 160))
+        if analysis.image is None:
+            img = get_loader().load(path)
+            analysis = FaceAnalysis(boxes=analysis.boxes, probs=analysis.probs, landmarks=analysis.landmarks, image=img)
 
-        try:
-            faces.append(face)
-        except ValueError:
-            invalid_imgs.append(path)
+        faces.append(crop_face(analysis))
 
     return faces, invalid_imgs
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from data.dataset.fetcher import DatasetFetcher
+
+IMG_LIMIT = 2
+
+
+class FakeDownload:
+    """
+    Download function which writes img_limit small images into output_dir/query folder.
+    Queries listed in fail raise instead, and the first `concurrent` calls wait for each other
+    """
+
+    def __init__(self, fail: tuple = (), concurrent: int = 1) -> None:
+        self.fail = fail
+        self.queries = []
+        self.lock = threading.Lock()
+        self.barrier = threading.Barrier(concurrent, timeout=5) if concurrent > 1 else None
+
+    def __call__(self, query: str, limit: int, output_dir: str) -> None:
+        with self.lock:
+            self.queries.append(query)
+            wait = self.barrier is not None and len(self.queries) <= self.barrier.parties
+
+        # fails with BrokenBarrierError unless enough calls run at the same time
+        if wait:
+            self.barrier.wait()
+
+        if any(query.startswith(name) for name in self.fail):
+            raise ConnectionError(f'Failed to download {query}')
+
+        folder_path = os.path.join(output_dir, query)
+        os.makedirs(folder_path)
+        for i in range(limit):
+            Image.new('RGB', (4, 4)).save(os.path.join(folder_path, f'Image_{i}.jpg'))
+
+    @property
+    def names(self) -> list:
+        return sorted(query[:-len(' rapper face')] for query in self.queries)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'images'), str(tmp_path / 'fetch_progress.json')
+
+
+def _fetcher(paths: tuple, names: list, download: FakeDownload, workers: int = 4) -> DatasetFetcher:
+    output_folder, checkpoint_path = paths
+
+    return DatasetFetcher(
+        names=names,
+        output_folder=output_folder,
+        img_limit=IMG_LIMIT,
+        delete_existing=False,
+        workers=workers,
+        download_fn=download,
+        checkpoint_path=checkpoint_path
+    )
+
+
+def test_names_are_fetched_concurrently(paths):
+    names = ['a', 'b', 'c', 'd']
+    download = FakeDownload(concurrent=4)
+
+    _fetcher(paths, names, download).fetch_dataset()
+
+    assert download.names == names
+    for name in names:
+        assert len(os.listdir(os.path.join(paths[0], name))) == IMG_LIMIT
+
+    with open(paths[1]) as input_file:
+        checkpoint = json.load(input_file)
+    assert checkpoint['output_folder'] == paths[0]
+    assert sorted(checkpoint['fetched']) == names
+
+
+def test_resume_skips_fetched_names(paths):
+    names = ['a', 'b', 'c']
+
+    with pytest.raises(RuntimeError):
+        _fetcher(paths, names, FakeDownload(fail=('b',))).fetch_dataset()
+
+    download = FakeDownload()
+    _fetcher(paths, names, download).fetch_dataset()
+
+    assert download.names == ['b']
+
+
+def test_checkpointed_name_with_empty_folder_is_fetched_again(paths):
+    fetcher = _fetcher(paths, ['a', 'b'], FakeDownload())
+    fetcher.fetch_dataset()
+
+    folder_path = os.path.join(paths[0], 'a')
+    for file_name in os.listdir(folder_path):
+        os.remove(os.path.join(folder_path, file_name))
+
+    assert not fetcher.is_fetched('a')
+    assert fetcher.is_fetched('b')
+
+    download = FakeDownload()
+    _fetcher(paths, ['a', 'b'], download).fetch_dataset()
+
+    assert download.names == ['a']
+
+
+def test_complete_folder_without_checkpoint_is_fetched(paths):
+    FakeDownload()('a rapper face', IMG_LIMIT, paths[0])
+    os.rename(os.path.join(paths[0], 'a rapper face'), os.path.join(paths[0], 'a'))
+
+    fetcher = _fetcher(paths, ['a'], FakeDownload())
+
+    assert fetcher.is_fetched('a')
+    assert not fetcher.is_fetched('b')
+
+
+def test_checkpoint_of_other_output_folder_is_ignored(paths):
+    _fetcher(paths, ['a'], FakeDownload()).fetch_dataset()
+
+    other_paths = (paths[0] + '_other', paths[1])
+    download = FakeDownload()
+    _fetcher(other_paths, ['a'], download).fetch_dataset()
+
+    assert download.names == ['a']
@@ -0,0 +1,64 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+INIT = """from utils.lazy import lazy_exports
+
+__all__ = ['get_value', 'other_value']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'get_value': '.get_value',
+    'other_value': '.get_value'
+})
+"""
+
+MODULE = """def get_value():
+    return 42
+
+
+def other_value():
+    return 7
+"""
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """
+    Creates package whose exported function has the same name as the module it is defined in
+    """
+
+    name = 'lazy_test_package'
+    (tmp_path / name).mkdir()
+    (tmp_path / name / '__init__.py').write_text(INIT)
+    (tmp_path / name / 'get_value.py').write_text(MODULE)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield name
+
+    for module in [module for module in sys.modules if module.split('.')[0] == name]:
+        del sys.modules[module]
+
+
+def test_export_before_other_member(package):
+    from lazy_test_package import get_value
+    from lazy_test_package import other_value
+
+    assert get_value() == 42
+    assert other_value() == 7
+
+
+def test_other_member_before_export(package):
+    from lazy_test_package import other_value
+    from lazy_test_package import get_value
+
+    assert other_value() == 7
+    assert get_value() == 42
+
+
+def test_direct_submodule_import(package):
+    importlib.import_module(f'{package}.get_value')
+    from lazy_test_package import get_value
+
+    assert not isinstance(get_value, types.ModuleType)
+    assert get_value() == 42
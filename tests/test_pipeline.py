@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('torch')
+
+from tools import pipeline
+
+
+def _wait_for_threads(count: int, timeout: float = 5) -> int:
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > count and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    return threading.active_count()
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """
+    Replaces stages with functions which fill in an embedding per path and fail on paths named 'bad'
+    """
+
+    def decode(cache):
+        def process(chunk):
+            for item in chunk:
+                item.digest = f'digest_{item.path}'
+            return chunk
+        return process
+
+    def detect_and_crop(chunk):
+        if any(item.path == 'bad' for item in chunk):
+            raise ValueError('bad image')
+        return chunk
+
+    def embed(cache):
+        def process(chunk):
+            for item in chunk:
+                item.embedding = item.path
+            return chunk
+        return process
+
+    monkeypatch.setattr(pipeline, '_decode', decode)
+    monkeypatch.setattr(pipeline, '_detect_and_crop', detect_and_crop)
+    monkeypatch.setattr(pipeline, '_embed', embed)
+
+
+def test_results_in_paths_order(fake_stages):
+    paths = [str(i) for i in range(50)]
+    results = list(pipeline.iter_dataset_embeddings(paths, cache=None, chunk_size=3, queue_size=1))
+
+    assert results == [(path, f'digest_{path}', path) for path in paths]
+
+
+def test_early_stop_stops_stages(fake_stages):
+    threads_before = threading.active_count()
+
+    embeddings = pipeline.iter_dataset_embeddings([str(i) for i in range(1000)], cache=None, chunk_size=2, queue_size=1)
+    next(embeddings)
+    embeddings.close()
+
+    assert _wait_for_threads(threads_before) == threads_before
+
+
+def test_stage_error_stops_stages(fake_stages):
+    threads_before = threading.active_count()
+    paths = ['bad'] + [str(i) for i in range(1000)]
+
+    with pytest.raises(ValueError):
+        list(pipeline.iter_dataset_embeddings(paths, cache=None, chunk_size=2, queue_size=1))
+
+    assert _wait_for_threads(threads_before) == threads_before
@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tools.scheduler import MicroBatcher
+
+
+class FakeBatch:
+    """
+    Batch function which doubles numbers, records batches it was called with and fails on negative numbers
+    """
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items: list) -> list:
+        with self.lock:
+            self.batches.append(list(items))
+
+        if any(item < 0 for item in items):
+            raise ValueError('negative item')
+
+        return [2 * item for item in items]
+
+
+@pytest.fixture
+def fake_batch():
+    return FakeBatch()
+
+
+def test_concurrent_items_are_batched(fake_batch):
+    batcher = MicroBatcher(fake_batch, max_batch_size=8, max_wait_ms=200).start()
+    try:
+        futures = [batcher.submit(item) for item in range(8)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.stop()
+
+    assert results == [2 * item for item in range(8)]
+    assert fake_batch.batches == [list(range(8))]
+    assert batcher.stats()['batch_size_histogram'] == {'8': 1}
+
+
+def test_batch_size_is_bounded(fake_batch):
+    batcher = MicroBatcher(fake_batch, max_batch_size=3, max_wait_ms=200).start()
+    try:
+        futures = [batcher.submit(item) for item in range(7)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.stop()
+
+    assert results == [2 * item for item in range(7)]
+    assert all(len(batch) <= 3 for batch in fake_batch.batches)
+
+
+def test_failed_batch_is_retried_item_by_item(fake_batch):
+    batcher = MicroBatcher(fake_batch, max_batch_size=4, max_wait_ms=200).start()
+    try:
+        futures = [batcher.submit(item) for item in [1, -1, 2, 3]]
+
+        assert futures[0].result(timeout=5) == 2
+        with pytest.raises(ValueError):
+            futures[1].result(timeout=5)
+        assert futures[2].result(timeout=5) == 4
+        assert futures[3].result(timeout=5) == 6
+    finally:
+        batcher.stop()
+
+    assert fake_batch.batches == [[1, -1, 2, 3], [1], [-1], [2], [3]]
+
+
+def test_every_caller_gets_its_own_result(fake_batch):
+    batcher = MicroBatcher(fake_batch, max_batch_size=16, max_wait_ms=20).start()
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda item: batcher(item, timeout=5), range(64)))
+    finally:
+        batcher.stop()
+
+    assert results == [2 * item for item in range(64)]
+    assert batcher.stats()['items'] == 64
+
+
+def test_stop_processes_submitted_items(fake_batch):
+    batcher = MicroBatcher(fake_batch, max_batch_size=2, max_wait_ms=1000).start()
+    future = batcher.submit(5)
+    batcher.stop()
+
+    assert future.result(timeout=0) == 10
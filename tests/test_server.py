@@ -0,0 +1,119 @@
+import http.client
+import json
+import threading
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip('torch')
+
+from PIL import Image
+
+from tools.server import MatchServer
+
+
+class StubMatcher:
+    """
+    Matcher which answers every image with the first k rows of a fixed gallery
+    """
+
+    def __init__(self, gallery_size: int = 3) -> None:
+        self.index = range(gallery_size)
+
+    def match(self, imgs: list, k: int = 1) -> list:
+        return [[{'label': f'rapper_{i}', 'distance': float(i)} for i in range(k)] for _ in imgs]
+
+
+@pytest.fixture
+def server():
+    server = MatchServer(('127.0.0.1', 0), StubMatcher())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _image_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, format='PNG')
+
+    return buffer.getvalue()
+
+
+def _post(server: MatchServer, path: str, body: bytes = b'', headers: dict = None) -> tuple:
+    """
+    Sends POST request with exactly the given headers, http.client adds no Content-Length of its own
+
+    :return: tuple of (status, decoded JSON body)
+    """
+
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        connection.putrequest('POST', path)
+        for name, value in (headers or {}).items():
+            connection.putheader(name, value)
+        connection.endheaders(body)
+
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_match(server):
+    body = _image_bytes()
+    status, payload = _post(server, '/match?k=2', body, {'Content-Length': str(len(body))})
+
+    assert status == 200
+    assert [match['label'] for match in payload['matches']] == ['rapper_0', 'rapper_1']
+
+
+def test_k_is_capped_at_gallery_size(server):
+    body = _image_bytes()
+    status, payload = _post(server, '/match?k=50', body, {'Content-Length': str(len(body))})
+
+    assert status == 200
+    assert len(payload['matches']) == 3
+
+
+@pytest.mark.parametrize('k', ['0', '-1', 'x'])
+def test_bad_k(server, k):
+    body = _image_bytes()
+    status, _ = _post(server, f'/match?k={k}', body, {'Content-Length': str(len(body))})
+
+    assert status == 400
+
+
+def test_empty_body(server):
+    status, _ = _post(server, '/match', headers={'Content-Length': '0'})
+
+    assert status == 400
+
+
+def test_oversized_body(server):
+    status, _ = _post(server, '/match', headers={'Content-Length': str(1024 ** 3)})
+
+    assert status == 413
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_malformed_content_length(server, length):
+    status, _ = _post(server, '/match', headers={'Content-Length': length})
+
+    assert status == 400
+
+
+def test_missing_content_length(server):
+    status, _ = _post(server, '/match')
+
+    assert status == 411
+
+
+def test_not_an_image(server):
+    status, _ = _post(server, '/match', b'not an image', {'Content-Length': '12'})
+
+    assert status == 400
@@ -1,2 +1,9 @@
-from .trainer import train
-from .inference import inference, filter_inference_images
+from utils.lazy import lazy_exports
+
+__all__ = ['train', 'update', 'inference', 'filter_inference_images']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'train': '.trainer',
+    'update': '.trainer',
+    'inference': '.inference',
+    'filter_inference_images': '.inference'
+})
@@ -1,36 +1,21 @@
-import pickle
 from typing import List, Tuple
 
 import numpy as np
-import yaml
 
 from data.dataset import DatasetCleaner
 from embeddings import get_embedding
 from face_processing import extract_face
-from utils.img_utils import load_dataset_paths, load_folder_paths
+from utils.config import get_config
+from utils.img_utils import load_folder_paths
 from utils.logger import get_logger
+from utils.profiling import stage
+from .row_index import RowIndex
+from .search import load_index
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = get_logger(config['logger']['app_name'], __name__)
 
 
-def _nearest_indices_to_images(indices: np.ndarray) -> List[str]:
-    """
-    Returns images of corresponding nearest neighbors indices
-
-    :param indices: numpy array with neighbors indices
-    :return: list of image paths
-    """
-
-    nearest_neighbors = []
-    all_paths = load_dataset_paths(config['images']['root'])
-
-    for index in indices.flatten():
-        nearest_neighbors.append(all_paths[index])
-
-    return nearest_neighbors
-
-
 def filter_inference_images(folder_path: str) -> List[str]:
     """
     Preprocesses inference images:
@@ -67,12 +52,14 @@ def inference(img_paths: List[str]) -> Tuple[List[str], List[str]]:
     Predicts most similar rapper image and its class label
 
     :param img_paths: list of input image paths
-    :return: list of tuples for each image: (most_similar_image_path, class_label)
+    :return: list of most similar image paths and list of their class labels, one per extracted face.
+     Both are None for faces index found no neighbor for(e.g. IVF index probed only empty cells)
     """
 
-    with open(config['model']['clf_path'], 'rb') as input_file:
-        image_clf = pickle.load(input_file)
-        logger.info('Classifier loaded successfully')
+    index = load_index(config['model']['index_path'])
+    logger.info('Index loaded successfully')
+
+    row_index = RowIndex.load(config['model']['row_index_path'])
 
     face_imgs, invalid_imgs = extract_face(img_paths)
     embeddings = get_embedding(face_imgs)
@@ -80,8 +67,17 @@ def inference(img_paths: List[str]) -> Tuple[List[str], List[str]]:
     if len(invalid_imgs) != 0:
         logger.warn(f"Couldn't extract faces from {len(invalid_imgs)} images: {invalid_imgs}. They will be ignored")
 
-    nearest_neighbor_indices = image_clf.kneighbors(embeddings, 1, return_distance=False)
-    nearest_neighbors = _nearest_indices_to_images(nearest_neighbor_indices)
-    classes_pred = list(map(lambda x: x.split('/')[3], nearest_neighbors))
+    with stage('search', items=len(embeddings)):
+        _, nearest_neighbor_indices = index.search(embeddings, k=1)
+
+    # indices are padded with -1 when index found less than k neighbors
+    nearest_neighbor_indices = nearest_neighbor_indices[:, 0]
+    valid = nearest_neighbor_indices >= 0
+    if not valid.all():
+        logger.warning(f'No nearest neighbor found for {np.count_nonzero(~valid)} images')
+
+    nearest_neighbors, classes_pred = [None] * len(valid), [None] * len(valid)
+    for position, path, label in zip(np.flatnonzero(valid), *row_index.lookup(nearest_neighbor_indices[valid])):
+        nearest_neighbors[position], classes_pred[position] = path, label
 
     return nearest_neighbors, classes_pred
@@ -0,0 +1,87 @@
+from typing import List, Optional
+
+from PIL import Image
+
+from embeddings import get_embedding
+from face_processing import crop_faces, detect_faces
+from utils.config import get_config
+from utils.logger import get_logger
+from utils.profiling import stage
+from .row_index import RowIndex
+from .search import NearestNeighborIndex, load_index
+
+config = get_config()
+logger = get_logger(config['logger']['app_name'], __name__)
+
+
+class FaceMatcher:
+    """
+    Class to find most similar gallery images for input images. Index and row index are loaded once
+    and kept in memory, so the object is meant to live as long as the process serving requests
+    """
+
+    def __init__(self, index: NearestNeighborIndex, row_index: RowIndex) -> None:
+        """
+        :param index: nearest neighbor index over gallery embeddings
+        :param row_index: row index mapping index rows to gallery images
+        """
+
+        self.index = index
+        self.row_index = row_index
+        self.img_size = (config['images']['width'], config['images']['height'])
+
+    @classmethod
+    def from_config(cls) -> 'FaceMatcher':
+        """
+        Loads index and row index from paths in config file
+
+        :return: FaceMatcher object
+        """
+
+        index = load_index(config['model']['index_path'])
+        row_index = RowIndex.load(config['model']['row_index_path'])
+        logger.info(f'Loaded index with {len(index)} gallery images')
+
+        return cls(index=index, row_index=row_index)
+
+    def preprocess(self, img: 'Image') -> 'Image':
+        """
+        Brings input image to the same format and size as dataset images
+
+        :param img: PIL image
+        :return: PIL image
+        """
+
+        return img.convert(config['images']['mode']).resize(self.img_size)
+
+    def match(self, imgs: List['Image'], k: int = 1) -> List[Optional[List[dict]]]:
+        """
+        Finds k most similar gallery images for every input image
+
+        :param imgs: list of PIL images
+        :param k: number of matches per image
+        :return: list with one entry per input image: None if no face was found on it,
+         otherwise list of dicts {'label', 'path', 'distance'} sorted by distance
+        """
+
+        analyses = detect_faces([self.preprocess(img) for img in imgs], keep_images=True)
+        face_positions = [i for i, analysis in enumerate(analyses) if analysis.num_faces > 0]
+
+        results = [None] * len(imgs)
+        if not face_positions:
+            return results
+
+        embeddings = get_embedding(crop_faces([analyses[i] for i in face_positions]), progress=False)
+        with stage('search', items=len(embeddings)):
+            distances, indices = self.index.search(embeddings, k=k)
+
+        for position, row_distances, row_indices in zip(face_positions, distances, indices):
+            valid = row_indices >= 0
+            paths, labels = self.row_index.lookup(row_indices[valid])
+
+            results[position] = [
+                {'label': label, 'path': path, 'distance': float(distance)}
+                for label, path, distance in zip(labels, paths, row_distances[valid])
+            ]
+
+        return results
@@ -0,0 +1,258 @@
+import hashlib
+import queue
+import threading
+from io import BytesIO
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from embeddings import EmbeddingCache, get_embedding
+from face_processing import crop_faces, detect_faces
+from utils.config import get_config
+from utils.profiling import profiled
+
+config = get_config()
+
+_DONE = object()
+# seconds a blocked stage waits before checking whether the pipeline was stopped
+_POLL_INTERVAL = 0.1
+
+
+class _Item:
+    """
+    Single image travelling through the pipeline. Decoded image and face crop are dropped
+    as soon as the next stage no longer needs them
+    """
+
+    __slots__ = ('path', 'digest', 'img', 'face', 'embedding')
+
+    def __init__(self, path: str, digest: str = None) -> None:
+        self.path = path
+        self.digest = digest
+        self.img = None
+        self.face = None
+        self.embedding = None
+
+
+class _StageError:
+    """
+    Exception raised in a stage, passed downstream instead of a chunk
+    """
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+
+def _put(out_queue: queue.Queue, chunk: object, stop: threading.Event) -> bool:
+    """
+    Puts chunk into a bounded queue, giving up once the pipeline is stopped
+
+    :param out_queue: queue to put chunk into
+    :param chunk: chunk, end of stream marker or stage error
+    :param stop: event set when the consumer stopped reading
+    :return: whether chunk was put
+    """
+
+    while not stop.is_set():
+        try:
+            out_queue.put(chunk, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _get(in_queue: queue.Queue, stop: threading.Event) -> object:
+    """
+    Takes chunk from a queue, giving up once the pipeline is stopped
+
+    :param in_queue: queue to take chunk from
+    :param stop: event set when the consumer stopped reading
+    :return: chunk or _DONE if the pipeline was stopped
+    """
+
+    while not stop.is_set():
+        try:
+            return in_queue.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+    return _DONE
+
+
+def _run_stage(
+        process: Callable[[List[_Item]], List[_Item]],
+        in_queue: queue.Queue,
+        out_queue: queue.Queue,
+        stop: threading.Event
+        ) -> None:
+    """
+    Processes chunks from in_queue and puts them into out_queue until end of stream.
+    A failure is passed downstream to the consumer, which then stops the pipeline.
+    The stage exits as soon as the pipeline is stopped, so neither blocked stages nor the chunks they hold outlive it
+
+    :param process: function applied to every chunk
+    :param in_queue: queue of input chunks
+    :param out_queue: queue of output chunks
+    :param stop: event set when the consumer stopped reading
+    """
+
+    while True:
+        chunk = _get(in_queue, stop)
+
+        if chunk is _DONE or isinstance(chunk, _StageError):
+            _put(out_queue, chunk, stop)
+            return
+
+        try:
+            chunk = process(chunk)
+        except Exception as e:
+            _put(out_queue, _StageError(e), stop)
+            return
+
+        if not _put(out_queue, chunk, stop):
+            return
+
+
+def _decode(cache: EmbeddingCache) -> Callable[[List[_Item]], List[_Item]]:
+    """
+    Creates decode stage: reads every file once, hashes its bytes, takes embedding from cache
+    if present and decodes image otherwise. Files whose digest is already known are not read
+    if their embedding is cached
+
+    :param cache: embedding cache
+    :return: stage function
+    """
+
+    @profiled('pipeline.decode', items='chunk')
+    def process(chunk: List[_Item]) -> List[_Item]:
+        for item in chunk:
+            if item.digest is not None:
+                item.embedding = cache.get(item.digest)
+                if item.embedding is not None:
+                    continue
+
+            with open(item.path, 'rb') as input_file:
+                data = input_file.read()
+
+            item.digest = hashlib.sha256(data).hexdigest()
+            item.embedding = cache.get(item.digest)
+
+            if item.embedding is None:
+                item.img = Image.open(BytesIO(data)).convert('RGB')
+
+        return chunk
+
+    return process
+
+
+@profiled('pipeline.detect_and_crop', items='chunk')
+def _detect_and_crop(chunk: List[_Item]) -> List[_Item]:
+    """
+    Detect stage: detects faces on decoded images in one batch, aligns and crops the first face
+
+    :param chunk: list of items
+    :return: the same list of items
+    """
+
+    pending = [item for item in chunk if item.img is not None]
+    if pending:
+        analyses = detect_faces([item.img for item in pending], keep_images=True)
+
+        found = [(item, analysis) for item, analysis in zip(pending, analyses) if analysis.num_faces > 0]
+        faces = crop_faces([analysis for _, analysis in found])
+
+        for (item, _), face in zip(found, faces):
+            item.face = face
+        for item in pending:
+            item.img = None
+
+    return chunk
+
+
+def _embed(cache: EmbeddingCache) -> Callable[[List[_Item]], List[_Item]]:
+    """
+    Creates embed stage: embeds face crops in one batch and stores embeddings in cache
+
+    :param cache: embedding cache
+    :return: stage function
+    """
+
+    @profiled('pipeline.embed', items='chunk')
+    def process(chunk: List[_Item]) -> List[_Item]:
+        pending = [item for item in chunk if item.face is not None]
+        if pending:
+            embeddings = get_embedding(
+                [item.face for item in pending],
+                keys=[item.digest for item in pending],
+                cache=cache,
+                progress=False
+            )
+
+            for item, embedding in zip(pending, embeddings):
+                item.embedding = embedding
+                item.face = None
+
+        return chunk
+
+    return process
+
+
+def iter_dataset_embeddings(
+        paths: List[str],
+        cache: EmbeddingCache,
+        chunk_size: int = None,
+        queue_size: int = None,
+        digests: List[Optional[str]] = None
+        ) -> Iterator[Tuple[str, str, Optional[np.ndarray]]]:
+    """
+    Streams images through decode -> detect/align/crop -> embed stages, each running in its own thread.
+    Stages exchange chunks of chunk_size images through queues holding at most queue_size chunks,
+    so memory use doesn't depend on number of images. Stage threads exit when iteration stops for any reason:
+    end of stream, stage error, break out of the loop or close() of the iterator
+
+    :param paths: list of image paths
+    :param cache: embedding cache consulted before and filled after embedding
+    :param chunk_size: optional, number of images per chunk. Defaults to the config value
+    :param queue_size: optional, capacity of every queue between stages. Defaults to the config value
+    :param digests: optional, known content digests in the same order as paths, None where unknown
+    :return: iterator of tuples (path, content digest, embedding or None if no face was found) in paths order
+    """
+
+    chunk_size = chunk_size or config['train']['chunk_size']
+    queue_size = queue_size or config['train']['queue_size']
+
+    stages = [_decode(cache), _detect_and_crop, _embed(cache)]
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    # set when the consumer stops reading: after the last chunk, on a stage error, on break or close()
+    stop = threading.Event()
+
+    for stage, in_queue, out_queue in zip(stages, queues, queues[1:]):
+        threading.Thread(target=_run_stage, args=(stage, in_queue, out_queue, stop), daemon=True).start()
+
+    known_digests = digests if digests is not None else [None] * len(paths)
+
+    def feed() -> None:
+        for start in range(0, len(paths), chunk_size):
+            chunk = zip(paths[start:start + chunk_size], known_digests[start:start + chunk_size])
+            if not _put(queues[0], [_Item(path, digest) for path, digest in chunk], stop):
+                return
+        _put(queues[0], _DONE, stop)
+
+    threading.Thread(target=feed, daemon=True).start()
+
+    try:
+        while True:
+            chunk = queues[-1].get()
+
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, _StageError):
+                raise chunk.error
+
+            for item in chunk:
+                yield item.path, item.digest, item.embedding
+    finally:
+        stop.set()
@@ -0,0 +1,72 @@
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+
+class RowIndex:
+    """
+    Class to map nearest neighbor index rows to images they were created from
+    """
+
+    def __init__(self, paths: np.ndarray, labels: np.ndarray) -> None:
+        """
+        :param paths: numpy array of image paths, one per index row
+        :param labels: numpy array of image labels, one per index row
+        """
+
+        self.paths = np.asarray(paths)
+        self.labels = np.asarray(labels)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def lookup(self, indices: np.ndarray) -> Tuple[List[str], List[str]]:
+        """
+        Translates row indices to image paths and labels
+
+        :param indices: numpy array of row indices of any shape
+        :return: tuple of list of image paths and list of their labels in flattened indices order
+        """
+
+        indices = np.asarray(indices).ravel()
+
+        return self.paths[indices].tolist(), self.labels[indices].tolist()
+
+    def append(self, paths: List[str], labels: List[str]) -> None:
+        """
+        Appends rows added to nearest neighbor index
+
+        :param paths: list of image paths, one per new index row
+        :param labels: list of image labels, one per new index row
+        """
+
+        # string dtype is widened if new paths or labels are longer than stored ones
+        self.paths = np.concatenate((self.paths, np.asarray(paths, dtype=str)))
+        self.labels = np.concatenate((self.labels, np.asarray(labels, dtype=str)))
+
+    def save(self, path: str) -> None:
+        """
+        Saves row index as .npz file
+
+        :param path: path to output file
+        """
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as output_file:
+            np.savez(output_file, paths=self.paths, labels=self.labels)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RowIndex':
+        """
+        Loads row index saved with RowIndex.save
+
+        :param path: path to .npz file
+        :return: RowIndex object
+        """
+
+        with np.load(path) as data:
+            return cls(paths=data['paths'], labels=data['labels'])
@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Class to group concurrently submitted items into batches. A batch is dispatched when it holds
+    max_batch_size items or when its first item has waited max_wait_ms, whichever comes first.
+    Batches are processed one at a time by a single worker thread and results are handed back to every caller.
+    If a batch fails, its items are processed again one by one, so an item which can't be processed
+    fails only its own caller
+    """
+
+    def __init__(
+            self,
+            process_batch: Callable[[List[Any]], List[Any]],
+            max_batch_size: int,
+            max_wait_ms: float
+            ) -> None:
+        """
+        :param process_batch: function which takes list of items and returns list of results in the same order
+        :param max_batch_size: maximal number of items in a batch
+        :param max_wait_ms: maximal time in milliseconds the first item of a batch waits for other items
+        """
+
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+        self._worker = None
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items_processed = 0
+        self._busy_time = 0.0
+
+    def start(self) -> 'MicroBatcher':
+        """
+        Starts worker thread
+
+        :return: self
+        """
+
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._worker.start()
+
+        return self
+
+    def stop(self) -> None:
+        """
+        Processes already submitted items and stops worker thread
+        """
+
+        if self._worker is not None:
+            self._queue.put(_STOP)
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, item: Any) -> Future:
+        """
+        Schedules item for processing
+
+        :param item: item to process
+        :return: future which resolves to the item's result
+        """
+
+        future = Future()
+        self._queue.put((item, future))
+
+        return future
+
+    def __call__(self, item: Any, timeout: float = None) -> Any:
+        """
+        Schedules item for processing and waits for its result
+
+        :param item: item to process
+        :param timeout: optional, maximal number of seconds to wait
+        :return: result of the item
+        """
+
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        """
+        :return: dict with current queue depth, number of processed batches and items,
+         mean batch size, time spent processing batches and batch size histogram
+        """
+
+        with self._stats_lock:
+            n_batches = sum(self._batch_sizes.values())
+
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': n_batches,
+                'items': self._items_processed,
+                'mean_batch_size': self._items_processed / n_batches if n_batches else 0.0,
+                'busy_seconds': self._busy_time,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            }
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        """
+        Collects batch which starts with the given entry
+
+        :param first: first (item, future) entry of the batch
+        :return: list of (item, future) entries
+        """
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if entry is _STOP:
+                # put the sentinel back so the worker stops right after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+
+        return batch
+
+    def _process_single(self, item: Any, future: Future) -> None:
+        """
+        Processes item as a batch of its own and resolves its future
+
+        :param item: item to process
+        :param future: future of the item
+        """
+
+        try:
+            future.set_result(self.process_batch([item])[0])
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run(self) -> None:
+        """
+        Worker loop: collects batches, processes them and resolves futures
+        """
+
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+
+            batch = self._collect(entry)
+            items = [item for item, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    for item, future in batch:
+                        self._process_single(item, future)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            elapsed = time.perf_counter() - start
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._items_processed += len(batch)
+                self._busy_time += elapsed
@@ -0,0 +1,5 @@
+from .base import NearestNeighborIndex, load_index
+from .cosine import CosineIndex
+from .exact import ExactIndex
+from .factory import build_index
+from .ivf import IVFIndex
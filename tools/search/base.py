@@ -0,0 +1,161 @@
+import os
+import pickle
+from abc import ABC, abstractmethod
+from typing import Tuple
+
+import numpy as np
+
+
+def top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects k smallest distances in every row without sorting the whole row
+
+    :param distances: numpy array of shape (n_queries, n_candidates)
+    :param k: number of neighbors, k <= n_candidates
+    :return: tuple of numpy arrays of shape (n_queries, k): sorted distances and their column indices
+    """
+
+    indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    top_distances = np.take_along_axis(distances, indices, axis=1)
+
+    order = np.argsort(top_distances, axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    top_distances = np.take_along_axis(top_distances, order, axis=1)
+
+    return top_distances, indices
+
+
+def squared_l2(queries: np.ndarray, vectors: np.ndarray, vectors_sq_norms: np.ndarray) -> np.ndarray:
+    """
+    Computes squared euclidean distances between every query and every vector with one matrix multiplication
+
+    :param queries: numpy array of shape (n_queries, dim)
+    :param vectors: numpy array of shape (n_vectors, dim)
+    :param vectors_sq_norms: numpy array of shape (n_vectors,) with squared norms of vectors
+    :return: numpy array of shape (n_queries, n_vectors)
+    """
+
+    distances = queries @ vectors.T
+    distances *= -2
+    distances += vectors_sq_norms[None, :]
+    distances += np.einsum('ij,ij->i', queries, queries)[:, None]
+
+    return np.maximum(distances, 0, out=distances)
+
+
+class RowBuffer:
+    """
+    Growable array with amortised O(1) appends of rows: capacity doubles whenever it runs out
+    """
+
+    def __init__(self, rows: np.ndarray) -> None:
+        """
+        :param rows: numpy array with initial rows
+        """
+
+        self._data = np.ascontiguousarray(rows)
+        self._size = len(rows)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """
+        :return: view of stored rows
+        """
+
+        return self._data[:self._size]
+
+    def append(self, rows: np.ndarray) -> None:
+        """
+        Appends rows. Only rows are copied unless capacity runs out
+
+        :param rows: numpy array with the same trailing shape as stored rows
+        """
+
+        rows = np.asarray(rows, dtype=self._data.dtype)
+        new_size = self._size + len(rows)
+
+        if new_size > len(self._data):
+            data = np.empty(shape=(max(new_size, 2 * len(self._data)),) + self._data.shape[1:], dtype=self._data.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+
+        self._data[self._size:new_size] = rows
+        self._size = new_size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getstate__(self) -> dict:
+        # spare capacity is not saved
+        return {'rows': self.rows}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['rows'])
+
+
+class NearestNeighborIndex(ABC):
+    """
+    Base class for nearest neighbor search over face embeddings
+    """
+
+    @abstractmethod
+    def fit(self, embeddings: np.ndarray) -> 'NearestNeighborIndex':
+        """
+        Builds index over gallery embeddings. Row i of embeddings gets id i
+
+        :param embeddings: numpy array of shape (n_rows, dim)
+        :return: self
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, embeddings: np.ndarray) -> 'NearestNeighborIndex':
+        """
+        Appends embeddings to already built index without rebuilding it. New rows get ids len(self), len(self) + 1, ...
+
+        :param embeddings: numpy array of shape (n_new_rows, dim)
+        :return: self
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k nearest gallery rows for every query
+
+        :param queries: numpy array of shape (n_queries, dim)
+        :param k: number of neighbors
+        :return: tuple of numpy arrays of shape (n_queries, k): euclidean distances and row ids sorted by distance
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def save(self, path: str) -> None:
+        """
+        Saves index
+
+        :param path: path to output file
+        """
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        with open(path, 'wb') as output_file:
+            pickle.dump(self, output_file)
+
+
+def load_index(path: str) -> NearestNeighborIndex:
+    """
+    Loads index saved with NearestNeighborIndex.save
+
+    :param path: path to index file
+    :return: NearestNeighborIndex object
+    """
+
+    with open(path, 'rb') as input_file:
+        return pickle.load(input_file)
@@ -0,0 +1,107 @@
+import argparse
+import time
+from typing import Dict
+
+import numpy as np
+
+from .base import NearestNeighborIndex
+from .exact import ExactIndex
+from .ivf import IVFIndex
+
+
+def _timed_search(index: NearestNeighborIndex, queries: np.ndarray, k: int):
+    """
+    :return: tuple of search result and mean per query latency in milliseconds
+    """
+
+    start = time.perf_counter()
+    result = index.search(queries, k)
+    latency = (time.perf_counter() - start) * 1000 / len(queries)
+
+    return result, latency
+
+
+def benchmark(
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        n_lists: int = 64,
+        n_probes: tuple = (1, 2, 4, 8, 16),
+        k: int = 1
+        ) -> Dict[str, dict]:
+    """
+    Measures recall@k and per query latency of IVF index against exact search
+
+    :param embeddings: gallery embeddings of shape (n_rows, dim)
+    :param queries: query embeddings of shape (n_queries, dim)
+    :param n_lists: number of IVF cells
+    :param n_probes: n_probe values to evaluate
+    :param k: number of neighbors
+    :return: dict of backend name -> {'recall': recall@k, 'latency_ms': mean per query latency}
+    """
+
+    exact = ExactIndex().fit(embeddings)
+    (_, true_indices), exact_latency = _timed_search(exact, queries, k)
+    results = {'exact': {'recall': 1.0, 'latency_ms': exact_latency}}
+
+    ivf = IVFIndex(n_lists=n_lists).fit(embeddings)
+    for n_probe in n_probes:
+        ivf.n_probe = n_probe
+        (_, indices), latency = _timed_search(ivf, queries, k)
+
+        hits = [len(set(found) & set(true)) for found, true in zip(indices, true_indices)]
+        results[f'ivf(n_lists={n_lists}, n_probe={n_probe})'] = {
+            'recall': sum(hits) / true_indices.size,
+            'latency_ms': latency
+        }
+
+    return results
+
+
+def _synthetic_embeddings(n_rows: int, n_queries: int, dim: int, seed: int):
+    """
+    Creates clustered unit vectors resembling face embeddings: several noisy rows per identity
+
+    :return: tuple of gallery and query numpy arrays
+    """
+
+    rng = np.random.default_rng(seed)
+    identities = rng.normal(size=(max(1, n_rows // 100), dim)).astype(np.float32)
+
+    gallery = identities[rng.integers(len(identities), size=n_rows)]
+    gallery = gallery + rng.normal(scale=0.6, size=gallery.shape).astype(np.float32)
+    queries = gallery[rng.integers(n_rows, size=n_queries)]
+    queries = queries + rng.normal(scale=0.3, size=queries.shape).astype(np.float32)
+
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    return gallery, queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare approximate nearest neighbor search with exact search')
+    parser.add_argument('--embeddings', help='path to gallery .npy file. Synthetic embeddings are used if not given')
+    parser.add_argument('--rows', type=int, default=100000, help='number of synthetic gallery rows')
+    parser.add_argument('--queries', type=int, default=1000, help='number of queries')
+    parser.add_argument('--n-lists', type=int, default=256, help='number of IVF cells')
+    parser.add_argument('--k', type=int, default=1, help='number of neighbors')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        embeddings = np.load(args.embeddings, mmap_mode='r')
+        rng = np.random.default_rng(args.seed)
+        queries = embeddings[rng.integers(len(embeddings), size=args.queries)]
+        queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    else:
+        embeddings, queries = _synthetic_embeddings(args.rows, args.queries, 512, args.seed)
+
+    results = benchmark(embeddings, queries, n_lists=args.n_lists, k=args.k)
+
+    print(f'{"backend":<40}{"recall@" + str(args.k):>10}{"ms/query":>12}')
+    for name, result in results.items():
+        print(f'{name:<40}{result["recall"]:>10.3f}{result["latency_ms"]:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
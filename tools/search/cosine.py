@@ -0,0 +1,95 @@
+from typing import Tuple
+
+import numpy as np
+
+from .base import NearestNeighborIndex, RowBuffer, top_k
+from .quantization import encode, l2_normalize
+
+
+class CosineIndex(NearestNeighborIndex):
+    """
+    Exact cosine similarity search over L2-normalised embeddings stored as float32, float16 or per-row-scaled int8.
+    A query batch is answered with one matrix multiplication per gallery block and argpartition top-k
+    """
+
+    def __init__(self, storage: str = 'float16', block_size: int = 65536) -> None:
+        """
+        :param storage: gallery storage dtype, one of: float32, float16, int8
+        :param block_size: number of gallery rows decoded to float32 at once. Bounds temporary memory of a search
+        """
+
+        self.storage = storage
+        self.block_size = block_size
+
+        self._codes = None
+        self._scales = None
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes.rows if self._codes is not None else None
+
+    @property
+    def scales(self) -> np.ndarray:
+        return self._scales.rows if self._scales is not None else None
+
+    def fit(self, embeddings: np.ndarray) -> 'CosineIndex':
+        codes, scales = encode(l2_normalize(embeddings), self.storage)
+
+        self._codes = RowBuffer(codes)
+        self._scales = RowBuffer(scales) if scales is not None else None
+
+        return self
+
+    def add(self, embeddings: np.ndarray) -> 'CosineIndex':
+        if self._codes is None:
+            return self.fit(embeddings)
+
+        codes, scales = encode(l2_normalize(embeddings), self.storage)
+
+        self._codes.append(codes)
+        if scales is not None:
+            self._scales.append(scales)
+
+        return self
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k most cosine-similar gallery rows for every query
+
+        :param queries: numpy array of shape (n_queries, dim)
+        :param k: number of neighbors
+        :return: tuple of numpy arrays of shape (n_queries, k): euclidean distances between normalised vectors,
+         sqrt(2 - 2 * cosine similarity), and row ids sorted by distance
+        """
+
+        queries = l2_normalize(np.atleast_2d(queries))
+        k = min(k, len(self))
+
+        codes, scales = self.codes, self.scales
+
+        best_similarities = np.empty(shape=(len(queries), 0), dtype=np.float32)
+        best_indices = np.empty(shape=(len(queries), 0), dtype=np.int64)
+
+        for start in range(0, len(self), self.block_size):
+            block = codes[start:start + self.block_size]
+            similarities = queries @ block.T.astype(np.float32)
+
+            if scales is not None:
+                similarities *= scales[None, start:start + self.block_size]
+
+            # top_k selects smallest values, so similarities are negated
+            block_similarities, block_indices = top_k(-similarities, min(k, len(block)))
+            best_similarities = np.hstack((best_similarities, -block_similarities))
+            best_indices = np.hstack((best_indices, block_indices + start))
+
+            if best_similarities.shape[1] > k:
+                best_similarities, order = top_k(-best_similarities, k)
+                best_similarities = -best_similarities
+                best_indices = np.take_along_axis(best_indices, order, axis=1)
+
+        distances = np.sqrt(np.maximum(2 - 2 * best_similarities, 0))
+
+        return distances, best_indices
+
+    def __len__(self) -> int:
+        return len(self._codes) if self._codes is not None else 0
@@ -0,0 +1,49 @@
+from typing import Tuple
+
+import numpy as np
+
+from .base import NearestNeighborIndex, RowBuffer, squared_l2, top_k
+
+
+class ExactIndex(NearestNeighborIndex):
+    """
+    Brute-force nearest neighbor search: one matrix multiplication against the whole gallery per query batch
+    """
+
+    def __init__(self) -> None:
+        self._embeddings = RowBuffer(np.empty(shape=(0, 0), dtype=np.float32))
+        self._sq_norms = RowBuffer(np.empty(shape=(0,), dtype=np.float32))
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._embeddings.rows
+
+    def fit(self, embeddings: np.ndarray) -> 'ExactIndex':
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        self._embeddings = RowBuffer(embeddings)
+        self._sq_norms = RowBuffer(np.einsum('ij,ij->i', embeddings, embeddings))
+
+        return self
+
+    def add(self, embeddings: np.ndarray) -> 'ExactIndex':
+        if len(self) == 0:
+            return self.fit(embeddings)
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        self._embeddings.append(embeddings)
+        self._sq_norms.append(np.einsum('ij,ij->i', embeddings, embeddings))
+
+        return self
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+
+        distances, indices = top_k(squared_l2(queries, self.embeddings, self._sq_norms.rows), k)
+
+        return np.sqrt(distances), indices
+
+    def __len__(self) -> int:
+        return len(self._embeddings)
@@ -0,0 +1,24 @@
+from .base import NearestNeighborIndex
+from .cosine import CosineIndex
+from .exact import ExactIndex
+from .ivf import IVFIndex
+
+
+def build_index(index_config: dict) -> NearestNeighborIndex:
+    """
+    Creates an empty index of the backend specified in config
+
+    :param index_config: 'index' section of config file
+    :return: NearestNeighborIndex object
+    """
+
+    backend = index_config['backend']
+
+    if backend == 'exact':
+        return ExactIndex()
+    if backend == 'cosine':
+        return CosineIndex(**index_config['cosine'])
+    if backend == 'ivf':
+        return IVFIndex(**index_config['ivf'])
+
+    raise ValueError(f'Unknown index backend {backend}, expected one of: cosine, exact, ivf')
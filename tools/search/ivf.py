@@ -0,0 +1,167 @@
+from typing import Tuple
+
+import numpy as np
+
+from .base import NearestNeighborIndex, RowBuffer, squared_l2, top_k
+
+
+def kmeans(
+        vectors: np.ndarray,
+        n_clusters: int,
+        n_iter: int,
+        seed: int
+        ) -> np.ndarray:
+    """
+    Clusters vectors with Lloyd's algorithm. Empty clusters keep their previous centroid
+
+    :param vectors: numpy array of shape (n_vectors, dim)
+    :param n_clusters: number of clusters
+    :param n_iter: number of iterations
+    :param seed: random seed used to pick initial centroids
+    :return: numpy array of centroids of shape (n_clusters, dim)
+    """
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        centroids_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+        assignments = squared_l2(vectors, centroids, centroids_sq_norms).argmin(axis=1)
+
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+
+        non_empty = counts > 0
+        new_centroids = centroids.copy()
+        new_centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+
+    return centroids
+
+
+class IVFIndex(NearestNeighborIndex):
+    """
+    Inverted file index: gallery is split into n_lists k-means cells and a query is compared
+    only with vectors of its n_probe closest cells. n_probe trades recall for latency
+    """
+
+    def __init__(self, n_lists: int = 64, n_probe: int = 8, n_iter: int = 20, seed: int = 0) -> None:
+        """
+        :param n_lists: number of k-means cells
+        :param n_probe: number of cells searched per query
+        :param n_iter: number of k-means iterations
+        :param seed: random seed of k-means initialisation
+        """
+
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+
+        self.centroids = None
+        self._centroids_sq_norms = None
+        # every cell keeps its own row ids, vectors and squared norms, so rows can be added to a cell in place
+        self._cell_ids = []
+        self._cell_vectors = []
+        self._cell_sq_norms = []
+        self._size = 0
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        return squared_l2(embeddings, self.centroids, self._centroids_sq_norms).argmin(axis=1)
+
+    def _add_to_cells(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        assignments = self._assign(embeddings)
+
+        for cell in np.unique(assignments):
+            rows = assignments == cell
+            vectors = embeddings[rows]
+
+            self._cell_ids[cell].append(ids[rows])
+            self._cell_vectors[cell].append(vectors)
+            self._cell_sq_norms[cell].append(np.einsum('ij,ij->i', vectors, vectors))
+
+        self._size += len(embeddings)
+
+    def fit(self, embeddings: np.ndarray) -> 'IVFIndex':
+        """
+        Clusters gallery into at most n_lists cells, a gallery smaller than n_lists gets one cell per row.
+        Empty gallery leaves index empty and the first add builds it
+        """
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(embeddings) == 0:
+            self.centroids, self._centroids_sq_norms = None, None
+            self._cell_ids, self._cell_vectors, self._cell_sq_norms = [], [], []
+            self._size = 0
+            return self
+
+        n_lists = min(self.n_lists, len(embeddings))
+
+        self.centroids = kmeans(embeddings, n_lists, self.n_iter, self.seed)
+        self._centroids_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+
+        dim = embeddings.shape[1]
+        self._cell_ids = [RowBuffer(np.empty(shape=(0,), dtype=np.int64)) for _ in range(n_lists)]
+        self._cell_vectors = [RowBuffer(np.empty(shape=(0, dim), dtype=np.float32)) for _ in range(n_lists)]
+        self._cell_sq_norms = [RowBuffer(np.empty(shape=(0,), dtype=np.float32)) for _ in range(n_lists)]
+        self._size = 0
+
+        self._add_to_cells(embeddings, np.arange(len(embeddings)))
+
+        return self
+
+    def add(self, embeddings: np.ndarray) -> 'IVFIndex':
+        """
+        Assigns new rows to their closest existing cells. Centroids are not retrained,
+        so after large additions fit should be called again to rebalance cells
+        """
+
+        if self.centroids is None:
+            return self.fit(embeddings)
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._add_to_cells(embeddings, np.arange(self._size, self._size + len(embeddings)))
+
+        return self
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.centroids is None:
+            empty_shape = (len(queries), 0)
+            return np.empty(shape=empty_shape, dtype=np.float32), np.empty(shape=empty_shape, dtype=np.int64)
+
+        n_probe = min(self.n_probe, len(self.centroids))
+
+        _, probed_lists = top_k(squared_l2(queries, self.centroids, self._centroids_sq_norms), n_probe)
+
+        distances = np.full(shape=(len(queries), k), fill_value=np.inf, dtype=np.float32)
+        indices = np.full(shape=(len(queries), k), fill_value=-1, dtype=np.int64)
+
+        # every probed cell is compared with all queries probing it in one matrix multiplication
+        # and its best candidates are merged into the running top-k of those queries
+        for cell in np.unique(probed_lists):
+            cell_size = len(self._cell_ids[cell])
+            if cell_size == 0:
+                continue
+
+            query_rows = np.nonzero((probed_lists == cell).any(axis=1))[0]
+            cell_distances = squared_l2(
+                queries[query_rows], self._cell_vectors[cell].rows, self._cell_sq_norms[cell].rows
+                )
+            cell_distances, cell_rows = top_k(cell_distances, min(k, cell_size))
+
+            merged_distances = np.hstack((distances[query_rows], np.sqrt(cell_distances)))
+            merged_indices = np.hstack((indices[query_rows], self._cell_ids[cell].rows[cell_rows]))
+
+            merged_distances, order = top_k(merged_distances, k)
+            distances[query_rows] = merged_distances
+            indices[query_rows] = np.take_along_axis(merged_indices, order, axis=1)
+
+        return distances, indices
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,58 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales every row to unit euclidean norm. Zero rows are left as they are
+
+    :param vectors: numpy array of shape (n_vectors, dim)
+    :return: float32 numpy array of shape (n_vectors, dim)
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def encode(vectors: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encodes vectors into compact storage dtype.
+    int8 codes use one scale per row: row = codes * scale, where scale = max(|row|) / 127
+
+    :param vectors: float32 numpy array of shape (n_vectors, dim)
+    :param storage: one of: float32, float16, int8
+    :return: tuple of codes of shape (n_vectors, dim) and per-row float32 scales of shape (n_vectors,) or None
+    """
+
+    if storage not in STORAGE_DTYPES:
+        raise ValueError(f'Unknown storage {storage}, expected one of: {", ".join(STORAGE_DTYPES)}')
+
+    if storage != 'int8':
+        return np.ascontiguousarray(vectors, dtype=storage), None
+
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales = np.maximum(scales, np.finfo(np.float32).tiny).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+
+    return codes, scales
+
+
+def decode(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Decodes vectors encoded with encode
+
+    :param codes: numpy array of shape (n_vectors, dim)
+    :param scales: per-row scales of shape (n_vectors,) or None
+    :return: float32 numpy array of shape (n_vectors, dim)
+    """
+
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+
+    return vectors
@@ -0,0 +1,204 @@
+import json
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, UnidentifiedImageError
+
+from utils.config import get_config
+from utils.logger import get_logger
+from utils.models import warm_up
+from .matcher import FaceMatcher
+from .scheduler import MicroBatcher
+
+config = get_config()
+logger = get_logger(config['logger']['app_name'], __name__)
+
+
+def _image_from_multipart(body: bytes, content_type: str) -> Optional[bytes]:
+    """
+    Extracts uploaded file from multipart/form-data body
+
+    :param body: request body
+    :param content_type: value of Content-Type header with boundary
+    :return: bytes of the first uploaded file or None if body has no files
+    """
+
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+
+    for part in message.iter_parts():
+        if part.get_filename() is not None:
+            return part.get_payload(decode=True)
+
+    return None
+
+
+def _match_batch(matcher: FaceMatcher, requests: List[Tuple['Image', int]]) -> List[Optional[List[dict]]]:
+    """
+    Answers many match requests with one pass through detector, embedder and index
+
+    :param matcher: FaceMatcher object
+    :param requests: list of tuples (PIL image, number of matches)
+    :return: list of match results, one per request
+    """
+
+    imgs, ks = zip(*requests)
+    results = matcher.match(list(imgs), k=max(ks))
+
+    return [result[:k] if result is not None else None for result, k in zip(results, ks)]
+
+
+class MatchRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the rapper look-alike service:
+    - GET /health: service status;
+    - GET /stats: request scheduler statistics;
+    - POST /match?k=<number of matches>: image uploaded either as raw request body
+      or as a file field of multipart/form-data body. Responds with most similar rappers as JSON.
+      k is capped at the gallery size and the configured maximum
+    """
+
+    server: 'MatchServer'
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+
+        if path == '/health':
+            self._send_json(HTTPStatus.OK, {'status': 'ok', 'gallery_size': len(self.server.matcher.index)})
+        elif path == '/stats':
+            self._send_json(HTTPStatus.OK, self.server.batcher.stats())
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown path {self.path}')
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != '/match':
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown path {self.path}')
+            return
+
+        try:
+            k = int(parse_qs(url.query).get('k', [config['server']['top_k']])[0])
+        except ValueError:
+            k = 0
+
+        if k < 1:
+            self._send_error(HTTPStatus.BAD_REQUEST, 'Parameter k must be a positive integer')
+            return
+        k = min(k, config['server']['max_k'], len(self.server.matcher.index))
+
+        if 'Content-Length' not in self.headers:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, 'Content-Length header is required')
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except ValueError:
+            length = -1
+
+        if length < 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, 'Content-Length must be a non-negative integer')
+            return
+        if length == 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, 'Request body is empty')
+            return
+        if length > config['server']['max_upload_mb'] * 1024 * 1024:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Uploaded image is too large')
+            return
+
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            body = _image_from_multipart(body, content_type)
+
+        try:
+            img = Image.open(BytesIO(body or b''))
+            img.load()
+        except (UnidentifiedImageError, OSError):
+            self._send_error(HTTPStatus.BAD_REQUEST, 'Request does not contain a valid image')
+            return
+
+        try:
+            matches = self.server.batcher((img, k))
+        except Exception:
+            logger.exception('Failed to match image')
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, 'Failed to process the image')
+            return
+
+        if matches is None:
+            self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, 'No face found on the image')
+            return
+
+        self._send_json(HTTPStatus.OK, {'matches': matches})
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f'{self.address_string()} - {format % args}')
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        self._send_json(status, {'error': message})
+
+    def _send_json(self, status: HTTPStatus, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MatchServer(ThreadingHTTPServer):
+    """
+    HTTP server which keeps one FaceMatcher for all requests.
+    Concurrent requests are grouped into batches by a MicroBatcher in front of the matcher
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, matcher: FaceMatcher) -> None:
+        """
+        :param address: tuple of (host, port)
+        :param matcher: FaceMatcher used to answer requests
+        """
+
+        super().__init__(address, MatchRequestHandler)
+        self.matcher = matcher
+        self.batcher = MicroBatcher(
+            process_batch=lambda requests: _match_batch(matcher, requests),
+            max_batch_size=config['server']['max_batch_size'],
+            max_wait_ms=config['server']['max_wait_ms']
+        ).start()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.batcher.stop()
+
+
+def serve(host: str = None, port: int = None) -> None:
+    """
+    Loads models and gallery once and serves requests until interrupted
+
+    :param host: optional, host to bind. Defaults to the config value
+    :param port: optional, port to bind. Defaults to the config value
+    """
+
+    host = host or config['server']['host']
+    port = port or config['server']['port']
+
+    matcher = FaceMatcher.from_config()
+    warm_up()
+
+    with MatchServer((host, port), matcher) as server:
+        logger.info(f'Serving on http://{host}:{port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Shutting down')
+
+
+if __name__ == '__main__':
+    serve()
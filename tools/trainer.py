@@ -1,61 +1,195 @@
+import os
 import pickle
+from typing import List
 
 import numpy as np
-import yaml
-from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import LabelEncoder
+from tqdm.auto import tqdm
 
-from embeddings import get_embedding
-from face_processing import extract_face
+from data.dataset.manifest import DatasetManifest
+from embeddings import EmbeddingCache, GalleryWriter, append_gallery, load_gallery
+from utils.config import get_config
 from utils.img_utils import ImageBatchProcessor
-from utils.img_utils import load_dataset_paths
+from utils.img_utils import label_from_path
 from utils.logger import get_logger
+from .pipeline import iter_dataset_embeddings
+from .row_index import RowIndex
+from .search import build_index, load_index
 
-config = yaml.safe_load(open('config/config.yaml'))
+config = get_config()
 logger = get_logger(config['logger']['app_name'], __name__)
 
 
-def train(root: str, embeddings: np.ndarray = None) -> None:
+def _load_manifest(root: str) -> DatasetManifest:
     """
-    Trains a classifier
+    :param root: path to root folder
+    :return: dataset manifest brought in line with images on disk
+    """
+
+    manifest = DatasetManifest(path=config['manifest']['path'], root=root)
+    added, changed, removed = manifest.update()
+    logger.info(f'Updated dataset manifest: {added} added, {changed} changed, {removed} removed images')
+
+    return manifest
+
+
+def _embed_dataset(img_paths: List[str], manifest: DatasetManifest) -> List[str]:
+    """
+    Streams dataset images through the embedding pipeline and writes gallery row by row.
+    Embeddings found in the embedding cache are reused, images with digests known from the manifest aren't even read.
+    The rest of images are decoded, aligned and embedded and their digests are stored in the manifest
+
+    :param img_paths: list of image paths
+    :param manifest: updated dataset manifest
+    :return: list of images from which faces couldn't be extracted. They are left out of the gallery
+    """
+
+    cache = EmbeddingCache(config['embeddings']['cache_dir'])
+    embeddings = iter_dataset_embeddings(img_paths, cache, digests=manifest.digests(img_paths))
+    invalid_imgs = []
+
+    with GalleryWriter(config['embeddings']['path']) as writer:
+        for path, digest, embedding in tqdm(embeddings, total=len(img_paths)):
+            manifest.set_digest(path, digest)
+            if embedding is None:
+                invalid_imgs.append(path)
+                continue
+
+            writer.append(embedding[None], [path], [label_from_path(path)], [digest])
+
+    return invalid_imgs
+
+
+def train(root: str, load_embeddings: bool = False) -> None:
+    """
+    Creates gallery embeddings and builds nearest neighbor index over them
 
     :param root: path to root folder
-    :param embeddings: optional, numpy array of embeddings
+    :param load_embeddings: whether to load previously saved embeddings instead of creating them
     """
 
-    all_img_paths = load_dataset_paths(root)
-    all_img_labels = list(map(lambda x: x.split('/')[3], all_img_paths))
+    if not load_embeddings:
+        manifest = _load_manifest(root)
 
-    if embeddings is None:
-        logger.info('Started extracting faces from images')
-        face_imgs, invalid_imgs = extract_face(all_img_paths)
-        logger.info('Finished extracting faces from images')
+        logger.info('Started creating face embeddings')
+        invalid_imgs = _embed_dataset(manifest.paths(), manifest)
+        logger.info('Finished creating face embeddings. Embeddings saved successfully')
 
         if len(invalid_imgs) != 0:
             batch_processor = ImageBatchProcessor()
             batch_processor.delete(invalid_imgs)
             logger.info(f'Couldnt extract faces from {len(invalid_imgs)} photos. Deleted them.')
 
-        logger.info('Started creating face embeddings')
-        embeddings = get_embedding(face_imgs)
-        logger.info('Finished creating face embeddings')
+        manifest.update()
+        manifest.save()
 
-        with open(config['embeddings']['path'], 'wb') as output_file:
-            pickle.dump(embeddings, output_file)
-            logger.info('Embeddings saved successfully')
+    gallery = load_gallery(config['embeddings']['path'])
+    logger.info(f'Loaded {len(gallery)} embeddings')
 
     encoder = LabelEncoder()
     encoder.fit(config['images']['labels'])
-    labels_encoded = encoder.transform(all_img_labels)
 
-    logger.info('Started fitting classifier')
-    images_clf = KNeighborsClassifier(n_neighbors=1)
-    images_clf.fit(embeddings, labels_encoded)
-    logger.info('Finished fitting classifier')
+    # raises if gallery holds labels which are missing from config file
+    encoder.transform(gallery.labels)
+
+    logger.info(f'Started building {config["index"]["backend"]} nearest neighbor index')
+    index = build_index(config['index']).fit(gallery.embeddings)
+    logger.info('Finished building nearest neighbor index')
+
+    index.save(config['model']['index_path'])
+    logger.info('Index saved successfully')
+
+    RowIndex(paths=gallery.paths, labels=gallery.labels).save(config['model']['row_index_path'])
+    logger.info('Row index saved successfully')
+
+    with open(config['model']['encoder_path'], 'wb') as output_file:
+        pickle.dump(encoder, output_file)
+
+
+def update(root: str, labels: List[str] = None) -> None:
+    """
+    Adds images which are not in the gallery yet(e.g. folders downloaded by extend_dataset) to the gallery,
+    nearest neighbor index, row index and label encoder without rebuilding them.
+    Face detection and embedding, the bulk of the work, are done for new images only and the gallery file
+    is appended in place. Index, row index and manifest are still rewritten whole on every call and the manifest
+    is rescanned, so this part stays proportional to the dataset size. Falls back to train if nothing was trained yet.
+    Images removed from dataset are not removed from the gallery, call train to drop them
+
+    :param root: path to root folder
+    :param labels: labels(folder names) to look for new images in. All folders are scanned if not given
+    """
+
+    model_paths = [config['embeddings']['path'], config['model']['index_path'],
+                   config['model']['row_index_path'], config['model']['encoder_path']]
+    if not all(map(os.path.exists, model_paths)):
+        logger.info('No trained model found, training from scratch')
+        train(root)
+        return
+
+    gallery = load_gallery(config['embeddings']['path'])
+    index = load_index(config['model']['index_path'])
+    if len(index) != len(gallery):
+        raise ValueError(f'Index has {len(index)} rows but gallery has {len(gallery)}. Call train to rebuild it')
+
+    manifest = _load_manifest(root)
+    known_paths = set(gallery.paths)
+    new_paths = [path for path in manifest.paths()
+                 if path not in known_paths and (labels is None or label_from_path(path) in labels)]
+
+    if len(new_paths) == 0:
+        logger.info('No new images found')
+        manifest.save()
+        return
+
+    logger.info(f'Started creating face embeddings for {len(new_paths)} new images')
+    cache = EmbeddingCache(config['embeddings']['cache_dir'])
+    new_items = iter_dataset_embeddings(new_paths, cache, digests=manifest.digests(new_paths))
+    embeddings, paths, digests, invalid_imgs = [], [], [], []
+
+    for path, digest, embedding in tqdm(new_items, total=len(new_paths)):
+        manifest.set_digest(path, digest)
+        if embedding is None:
+            invalid_imgs.append(path)
+            continue
+
+        embeddings.append(embedding)
+        paths.append(path)
+        digests.append(digest)
+    logger.info('Finished creating face embeddings')
+
+    if len(invalid_imgs) != 0:
+        batch_processor = ImageBatchProcessor()
+        batch_processor.delete(invalid_imgs)
+        logger.info(f'Couldnt extract faces from {len(invalid_imgs)} photos. Deleted them.')
+
+    manifest.update()
+    manifest.save()
+
+    if len(paths) == 0:
+        return
+
+    new_embeddings = np.stack(embeddings)
+    new_labels = [label_from_path(path) for path in paths]
+
+    with open(config['model']['encoder_path'], 'rb') as input_file:
+        encoder = pickle.load(input_file)
+
+    # LabelEncoder needs sorted classes. Codes of existing classes may shift, which is safe because
+    # codes are not stored anywhere: index rows are mapped to labels by the row index
+    encoder.classes_ = np.union1d(encoder.classes_, config['images']['labels'])
+    encoder.transform(new_labels)
+
+    append_gallery(config['embeddings']['path'], new_embeddings, paths, new_labels, digests)
+    logger.info(f'Appended {len(paths)} embeddings to the gallery')
+
+    index.add(new_embeddings)
+    index.save(config['model']['index_path'])
+    logger.info(f'Added {len(paths)} rows to nearest neighbor index')
 
-    with open(config['model']['clf_path'], 'wb') as output_file:
-        pickle.dump(images_clf, output_file)
-        logger.info('Classifier saved successfully')
+    row_index = RowIndex.load(config['model']['row_index_path'])
+    row_index.append(paths, new_labels)
+    row_index.save(config['model']['row_index_path'])
 
     with open(config['model']['encoder_path'], 'wb') as output_file:
         pickle.dump(encoder, output_file)
+    logger.info('Index, row index and label encoder saved successfully')
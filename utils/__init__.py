@@ -1 +1,4 @@
-from .plot_results import plot
+from .lazy import lazy_exports
+
+__all__ = ['plot']
+__getattr__, __dir__ = lazy_exports(__name__, {'plot': '.plot_results'})
@@ -0,0 +1,19 @@
+import functools
+
+import yaml
+
+CONFIG_PATH = 'config/config.yaml'
+
+
+@functools.lru_cache(maxsize=None)
+def get_config(path: str = CONFIG_PATH) -> dict:
+    """
+    Parses config file once per process. All modules share the returned dict,
+    so changes made to it(e.g. labels added by extend_dataset) are seen everywhere
+
+    :param path: path to config file
+    :return: config dict
+    """
+
+    with open(path) as config_file:
+        return yaml.safe_load(config_file)
@@ -1,4 +1,21 @@
-from .batch_processor import ImageBatchProcessor
-from .duplicates_handler import DuplicatesHandler
-from .load_image_paths import load_dataset_paths, load_folder_paths
-from .stats_calculator import ImageStatsCalculator
+from utils.lazy import lazy_exports
+
+__all__ = [
+    'ImageBatchProcessor', 'BKTree', 'ChannelStats', 'DuplicatesHandler', 'ImageLoader', 'PerceptualHashIndex',
+    'get_loader', 'label_from_path', 'load_dataset_paths', 'load_folder_paths', 'scan_dataset_files',
+    'ImageStatsCalculator'
+]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'ImageBatchProcessor': '.batch_processor',
+    'BKTree': '.bktree',
+    'ChannelStats': '.stats_calculator',
+    'DuplicatesHandler': '.duplicates_handler',
+    'ImageLoader': '.loader',
+    'PerceptualHashIndex': '.hash_index',
+    'get_loader': '.loader',
+    'label_from_path': '.load_image_paths',
+    'load_dataset_paths': '.load_image_paths',
+    'load_folder_paths': '.load_image_paths',
+    'scan_dataset_files': '.load_image_paths',
+    'ImageStatsCalculator': '.stats_calculator'
+})
@@ -1,9 +1,12 @@
 import os
+from functools import partial
 from typing import List, Tuple, Iterable
 
 from PIL import Image
 
+from utils.profiling import profiled
 from .load_image_paths import load_folder_paths
+from .loader import get_loader
 
 
 class ImageBatchProcessor:
@@ -11,55 +14,124 @@ class ImageBatchProcessor:
     A class to perform various operations on image paths batch
     """
 
-    def convert(self, paths: List[str],  mode: str) -> 'ImageBatchProcessor':
+    @profiled('ImageBatchProcessor.transform', items='paths')
+    def transform(self, paths: List[str], mode: str, size: Tuple[int, int], extension: str) -> List[str]:
         """
-        Converts images to specified format and saves them
+        Converts, resizes and changes extension of images in one pass: every image is decoded once
+        and written once. JPEG images are downscaled while decoding. Images which already have
+        desired format, size and extension are left untouched. Images are processed in parallel on the shared loader
 
         :param paths: list of image paths
         :param mode: desired image format
+        :param size: tuple of images' (new_width, new_height)
+        :param extension: desired image extension
+        :return: list of new image paths in the same order as paths
         """
 
-        for path in paths:
-            img = Image.open(path).convert(mode=mode)
+        transform_image = partial(self._transform_image, mode=mode, size=tuple(size), extension=extension)
+
+        return list(get_loader().map(transform_image, paths))
+
+    @staticmethod
+    def _transform_image(path: str, mode: str, size: Tuple[int, int], extension: str) -> str:
+        """
+        Transforms single image. New file is written next to the old one and then moved in place,
+        so image is never lost if the process is interrupted
+
+        :param path: image path
+        :param mode: desired image format
+        :param size: tuple of image's (new_width, new_height)
+        :param extension: desired image extension
+        :return: new image path
+        """
 
+        name, old_extension = os.path.splitext(path)
+        new_path = f'{name}.{extension}'
+        file_format = Image.registered_extensions()[f'.{extension.lower()}']
+
+        with Image.open(path) as img:
+            if (img.mode == mode and img.size == size and img.format == file_format
+                    and old_extension.lower() == f'.{extension.lower()}'):
+                return path
+
+            # JPEG can be decoded at 1/2, 1/4 or 1/8 scale, no smaller than requested size
+            img.draft(mode, size)
+            new_img = img.convert(mode).resize(size)
+
+        tmp_path = f'{new_path}.tmp'
+        new_img.save(tmp_path, format=file_format)
+        os.replace(tmp_path, new_path)
+
+        if new_path != path:
             os.remove(path)
-            img.save(path)
+
+        return new_path
+
+    @profiled('ImageBatchProcessor.convert', items='paths')
+    def convert(self, paths: List[str],  mode: str) -> 'ImageBatchProcessor':
+        """
+        Converts images to specified format and saves them. Images are processed in parallel on the shared loader
+
+        :param paths: list of image paths
+        :param mode: desired image format
+        """
+
+        for _ in get_loader().map(partial(self._convert_image, mode=mode), paths):
+            pass
 
         return self
 
+    @staticmethod
+    def _convert_image(path: str, mode: str) -> None:
+        img = get_loader().load(path, mode=mode, cache=False)
+
+        os.remove(path)
+        img.save(path)
+
+    @profiled('ImageBatchProcessor.resize', items='paths')
     def resize(self, paths: List[str], size: Tuple[int, int]) -> 'ImageBatchProcessor':
         """
-        Resizes and saves images
+        Resizes and saves images. Images are processed in parallel on the shared loader
 
         :param paths: list of image paths
         :param size: tuple of images' (new_width, new_height)
         :return: self
         """
 
-        for path in paths:
-            img = Image.open(path).resize(size)
-
-            os.remove(path)
-            img.save(path)
+        for _ in get_loader().map(partial(self._resize_image, size=size), paths):
+            pass
 
         return self
 
+    @staticmethod
+    def _resize_image(path: str, size: Tuple[int, int]) -> None:
+        img = get_loader().load(path, mode=None, cache=False).resize(size)
+
+        os.remove(path)
+        img.save(path)
+
+    @profiled('ImageBatchProcessor.change_extension', items='paths')
     def change_extension(self, paths: List[str], new_ext: str) -> 'ImageBatchProcessor':
         """
-        Changes all files extension and saves them
+        Changes all files extension and saves them. Images are processed in parallel on the shared loader
 
         :param paths: list of image paths
         :param new_ext: new image extension
         :return: self
         """
 
-        for path in paths:
-            name, extension = os.path.splitext(path)
-            Image.open(path).convert('RGB').save(f'{name}.{new_ext}')
-            os.remove(path)
+        for _ in get_loader().map(partial(self._change_extension, new_ext=new_ext), paths):
+            pass
 
         return self
 
+    @staticmethod
+    def _change_extension(path: str, new_ext: str) -> None:
+        name, extension = os.path.splitext(path)
+        get_loader().load(path, cache=False).save(f'{name}.{new_ext}')
+        os.remove(path)
+
+    @profiled('ImageBatchProcessor.delete', items='paths')
     def delete(self, paths: List[str]) -> 'ImageBatchProcessor':
         """
         Deletes batch of images
@@ -98,6 +170,9 @@ class ImageBatchProcessor:
 
         for name in os.listdir(root):
             folder_path = os.path.join(root, name)
+            if not os.path.isdir(folder_path):
+                continue
+
             folder_image_paths = load_folder_paths(folder_path)
             folder_image_paths.sort(key=lambda x: int(''.join(filter(str.isdigit, x))))
             yield folder_image_paths
@@ -0,0 +1,116 @@
+from typing import Any, List, Tuple
+
+import imagehash
+import numpy as np
+
+
+def pack_hash(image_hash: imagehash.ImageHash) -> int:
+    """
+    Packs bits of a perceptual hash into integer
+
+    :param image_hash: ImageHash object
+    :return: integer with one bit per hash bit
+    """
+
+    return int.from_bytes(np.packbits(image_hash.hash.flatten()).tobytes(), 'big')
+
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    """
+    Computes Hamming distance between two hashes packed into integers
+
+    :param hash1: first hash
+    :param hash2: second hash
+    :return: number of differing bits
+    """
+
+    return bin(hash1 ^ hash2).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes with Hamming distance. Answers "which hashes are within
+    distance d of this one" visiting only subtrees the triangle inequality can't rule out
+    """
+
+    def __init__(self) -> None:
+        # node is a list [hash, item, {distance to parent: child node}]
+        self._root = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_: int, item: Any = None) -> None:
+        """
+        Adds hash to the tree
+
+        :param hash_: hash packed into integer
+        :param item: optional, object returned together with the hash by search
+        """
+
+        self._size += 1
+        new_node = [hash_, item, {}]
+
+        if self._root is None:
+            self._root = new_node
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_, node[0])
+            child = node[2].get(distance)
+
+            if child is None:
+                node[2][distance] = new_node
+                return
+            node = child
+
+    def search(self, hash_: int, max_distance: int) -> List[Tuple[Any, int]]:
+        """
+        Finds all hashes within max_distance of the given one
+
+        :param hash_: hash packed into integer
+        :param max_distance: maximal Hamming distance
+        :return: list of tuples (item, distance)
+        """
+
+        found = []
+        stack = [self._root] if self._root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_, node[0])
+
+            if distance <= max_distance:
+                found.append((node[1], distance))
+
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        return found
+
+    def has_within(self, hash_: int, max_distance: int) -> bool:
+        """
+        Checks whether any hash lies within max_distance of the given one. Stops at the first match
+
+        :param hash_: hash packed into integer
+        :param max_distance: maximal Hamming distance
+        :return: True if such hash exists, False otherwise
+        """
+
+        stack = [self._root] if self._root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_, node[0])
+
+            if distance <= max_distance:
+                return True
+
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        return False
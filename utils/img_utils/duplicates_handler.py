@@ -1,10 +1,14 @@
-from itertools import combinations
-from typing import List
+import hashlib
+from typing import Iterable, List, Tuple
 
 import imagehash
 import numpy as np
 from PIL import Image
 
+from utils.profiling import profiled
+from .bktree import BKTree, pack_hash
+from .loader import get_loader
+
 
 class DuplicatesHandler:
     """
@@ -14,27 +18,90 @@ class DuplicatesHandler:
     def __init__(self, similarity: int, hash_size: int = 8) -> None:
         """
         :param similarity: minimal 'similarity' of 2 images to be considered duplicates. similarity є [0, 100]
-        :param hash_size:
+        :param hash_size: side of average hash, hash has hash_size**2 bits
         """
 
         self.similarity = similarity
         self.hash_size = hash_size
 
-    def handle(self, paths: List[str]) -> List[str]:
+    @profiled('DuplicatesHandler.handle', items='paths')
+    def handle(self, paths: List[str], known_hashes: Iterable[int] = ()) -> List[str]:
         """
-        Finds duplicates or similar images in the list
+        Finds duplicates or similar images in the list.
+        Image is reported if any image after it in the list is similar to or an exact duplicate of it,
+        so one image of every group of duplicates is kept.
+        Every image is decoded and hashed once on the shared loader, exact duplicates are found by pixel digest
+        and similar images by BK-tree search over average hashes
 
         :param paths: list of image paths
+        :param known_hashes: optional, packed average hashes of images kept earlier(e.g. in previous cleaning runs).
+         Images similar to any of them are reported too
         :return: list of paths to similar images
         """
 
+        fingerprints = list(get_loader().map(self._fingerprint, paths))
+        hashes = [packed_hash for packed_hash, _ in fingerprints]
+        digests = [digest for _, digest in fingerprints]
+
+        diff_limit = self._diff_limit()
+        later_hashes, later_digests = BKTree(), set()
+        for known_hash in known_hashes:
+            later_hashes.add(known_hash)
+
         similar_and_duplicates = []
-        for path1, path2 in combinations(paths, 2):
+        for i in reversed(range(len(paths))):
+            if digests[i] in later_digests or later_hashes.has_within(hashes[i], diff_limit):
+                similar_and_duplicates.append(paths[i])
+
+            later_hashes.add(hashes[i])
+            later_digests.add(digests[i])
+
+        return similar_and_duplicates[::-1]
+
+    def _fingerprint(self, path: str) -> Tuple[int, str]:
+        """
+        Decodes an image in its own mode, pixel digest depends on it
+
+        :param path: path to image
+        :return: tuple of packed average hash and pixel digest
+        """
+
+        img = get_loader().load(path, mode=None, cache=False)
+
+        return self.packed_hash(img), self.pixel_digest(img)
+
+    def packed_hash(self, img: 'Image') -> int:
+        """
+        Computes average hash of image packed into integer
+
+        :param img: PIL image
+        :return: hash_size**2-bit integer
+        """
+
+        return pack_hash(imagehash.average_hash(img, self.hash_size))
+
+    @staticmethod
+    def pixel_digest(img: 'Image') -> str:
+        """
+        Computes digest of image pixels. Images have equal digests only if they have equal size and pixels
+
+        :param img: PIL image
+        :return: hex digest
+        """
 
-            if self.are_similar(path1, path2) or self.are_duplicates(path1, path2):
-                similar_and_duplicates.append(path1)
+        digest = hashlib.sha1(f'{img.mode}{img.size}'.encode())
+        digest.update(img.tobytes())
 
-        return similar_and_duplicates
+        return digest.hexdigest()
+
+    def _diff_limit(self) -> int:
+        """
+        :return: maximal Hamming distance between hashes of similar images
+        """
+
+        threshold = 1 - self.similarity / 100
+
+        return int(threshold * self.hash_size**2)
 
     def are_similar(self, path1: str, path2: str) -> bool:
         """
@@ -45,8 +112,7 @@ class DuplicatesHandler:
         :return: True if  Hamming distance between images <= diff_limit, False otherwise
         """
 
-        threshold = 1 - self.similarity / 100
-        diff_limit = int(threshold * self.hash_size**2)
+        diff_limit = self._diff_limit()
 
         img1, img2 = Image.open(path1), Image.open(path2)
 
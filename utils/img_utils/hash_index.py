@@ -0,0 +1,178 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import imagehash
+from PIL import Image
+
+from .bktree import BKTree, pack_hash
+from .load_image_paths import label_from_path, scan_dataset_files
+from .loader import get_loader
+
+HASH_FUNCTIONS = {
+    'ahash': imagehash.average_hash,
+    'phash': imagehash.phash,
+    'dhash': imagehash.dhash
+}
+
+
+class PerceptualHashIndex:
+    """
+    Class to keep perceptual hashes of every image in the dataset on disk and to search them.
+    Records are refreshed incrementally: only images whose modification time or size changed are rehashed
+    """
+
+    def __init__(self, path: str, root: str, hash_size: int = 8) -> None:
+        """
+        :param path: path to index file(.json)
+        :param root: path to dataset root folder with one folder per label
+        :param hash_size: side of every hash, hashes have hash_size**2 bits
+        """
+
+        self.path = path
+        self.root = root
+        self.hash_size = hash_size
+
+        # image path -> {'mtime_ns', 'size', 'ahash', 'phash', 'dhash'}
+        self.records: Dict[str, dict] = {}
+        self._trees: Dict[str, BKTree] = {}
+
+        if os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        """
+        Reads index file. Records created with a different hash size are discarded
+        """
+
+        with open(self.path) as input_file:
+            data = json.load(input_file)
+
+        self.records = data['records'] if data['hash_size'] == self.hash_size else {}
+        self._trees = {}
+
+    def save(self) -> None:
+        """
+        Writes index file atomically
+        """
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        with open(f'{self.path}.tmp', 'w') as output_file:
+            json.dump({'hash_size': self.hash_size, 'records': self.records}, output_file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def update(self, files: Dict[str, Tuple[int, int]] = None) -> Tuple[int, int, int]:
+        """
+        Brings records in line with images on disk: hashes added and changed images on the shared loader,
+        forgets deleted ones
+
+        :param files: optional, output of scan_dataset_files for root, e.g. kept by the dataset manifest.
+         Root is scanned if not given
+        :return: tuple of numbers of (added, changed, removed) images
+        """
+
+        if files is None:
+            files = scan_dataset_files(self.root)
+
+        stale = []
+        for path, (size, mtime_ns) in files.items():
+            record = self.records.get(path)
+            # records written before modification times were kept in nanoseconds have no mtime_ns and are rehashed
+            if record is not None and record.get('mtime_ns') == mtime_ns and record['size'] == size:
+                continue
+
+            stale.append((path, size, mtime_ns, record is None))
+
+        hashes = get_loader().map(self._hash, [path for path, _, _, _ in stale])
+        for (path, size, mtime_ns, _), hashes_ in zip(stale, hashes):
+            self.records[path] = {'mtime_ns': mtime_ns, 'size': size, **hashes_}
+
+        added = sum(is_new for _, _, _, is_new in stale)
+        changed = len(stale) - added
+
+        removed = [path for path in self.records if path not in files]
+        for path in removed:
+            del self.records[path]
+
+        if added or changed or removed:
+            self._trees = {}
+
+        return added, changed, len(removed)
+
+    def packed_hash(self, path: str, kind: str = 'ahash') -> Optional[int]:
+        """
+        :param path: image path
+        :param kind: hash kind, one of: ahash, phash, dhash
+        :return: stored hash packed into integer or None if image is not indexed
+        """
+
+        record = self.records.get(path)
+
+        return int(record[kind], 16) if record is not None else None
+
+    def query(self, img: Union['Image', str], distance: int, kind: str = 'ahash') -> List[Tuple[str, int]]:
+        """
+        Finds indexed images within given Hamming distance of an image
+
+        :param img: one of: path to image, PIL image object
+        :param distance: maximal Hamming distance
+        :param kind: hash kind, one of: ahash, phash, dhash
+        :return: list of tuples (image path, distance) sorted by distance
+        """
+
+        if isinstance(img, str):
+            img = get_loader().load(img, mode=None)
+
+        hash_ = pack_hash(HASH_FUNCTIONS[kind](img, self.hash_size))
+
+        return sorted(self._tree(kind).search(hash_, distance), key=lambda x: x[1])
+
+    def cross_label_collisions(self, distance: int, kind: str = 'ahash') -> List[Tuple[str, str, int]]:
+        """
+        Finds pairs of images stored under different labels which are within given Hamming distance
+
+        :param distance: maximal Hamming distance
+        :param kind: hash kind, one of: ahash, phash, dhash
+        :return: list of tuples (first image path, second image path, distance), every pair reported once
+        """
+
+        tree = self._tree(kind)
+        collisions = []
+
+        for path, record in self.records.items():
+            label = label_from_path(path)
+
+            for other_path, other_distance in tree.search(int(record[kind], 16), distance):
+                if path < other_path and label_from_path(other_path) != label:
+                    collisions.append((path, other_path, other_distance))
+
+        return sorted(collisions)
+
+    def _hash(self, path: str) -> Dict[str, str]:
+        """
+        Computes all hash kinds of an image
+
+        :param path: path to image
+        :return: dict of hash kind -> hash as hex string
+        """
+
+        img = get_loader().load(path, mode=None, cache=False)
+
+        return {kind: format(pack_hash(function(img, self.hash_size)), 'x') for kind, function in HASH_FUNCTIONS.items()}
+
+    def _tree(self, kind: str) -> BKTree:
+        """
+        Returns BK-tree over hashes of given kind, building it on first use after every change
+
+        :param kind: hash kind, one of: ahash, phash, dhash
+        :return: BKTree with image paths as items
+        """
+
+        if kind not in self._trees:
+            tree = BKTree()
+            for path, record in self.records.items():
+                tree.add(int(record[kind], 16), path)
+            self._trees[kind] = tree
+
+        return self._trees[kind]
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List, Tuple
 
 
 def load_folder_paths(root: str) -> List[str]:
@@ -10,9 +10,9 @@ def load_folder_paths(root: str) -> List[str]:
     :return: list of full image paths
     """
 
-    folder_img_paths = [os.path.join(root, f).replace('\\', '/')
-                        for f in os.listdir(root)
-                        if os.path.isfile(os.path.join(root, f))]
+    # directory entries carry file type, so no file is stat-ed
+    with os.scandir(root) as entries:
+        folder_img_paths = [entry.path.replace('\\', '/') for entry in entries if entry.is_file()]
 
     return folder_img_paths
 
@@ -26,9 +26,43 @@ def load_dataset_paths(root: str) -> List[str]:
     """
 
     all_img_paths = []
-    for name in os.listdir(root):
-        folder_path = os.path.join(root, name)
-        folder_img_paths = load_folder_paths(folder_path)
-        all_img_paths.extend(folder_img_paths)
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                all_img_paths.extend(load_folder_paths(entry.path))
 
     return all_img_paths
+
+
+def scan_dataset_files(root: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Lists all files of dataset folder with their sizes and modification times. Only directory entries are read
+
+    :param root: path to root folder with one folder per label
+    :return: dict of file path -> tuple (size in bytes, modification time in nanoseconds)
+    """
+
+    files = {}
+    with os.scandir(root) as label_entries:
+        for label_entry in label_entries:
+            if not label_entry.is_dir():
+                continue
+
+            with os.scandir(label_entry.path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path.replace('\\', '/')] = (stat.st_size, stat.st_mtime_ns)
+
+    return files
+
+
+def label_from_path(path: str) -> str:
+    """
+    Extracts image label, which is the name of the folder image is stored in
+
+    :param path: image path
+    :return: image label
+    """
+
+    return os.path.basename(os.path.dirname(path))
@@ -0,0 +1,179 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar, Union
+
+from PIL import Image
+
+from utils.config import get_config
+
+config = get_config()
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class ImageLoader:
+    """
+    Class to decode images on a shared thread pool. PIL releases the GIL while decoding, so images are decoded
+    in parallel and ahead of the consumer, whose own work(e.g. model inference) overlaps with decoding.
+    Recently decoded images are kept in a small LRU cache
+    """
+
+    def __init__(self, workers: int = None, prefetch: int = None, cache_size: int = 0) -> None:
+        """
+        :param workers: optional, number of decoding threads. Defaults to the number of CPUs
+        :param prefetch: optional, number of images decoded ahead of the consumer. Defaults to 2 * workers
+        :param cache_size: number of decoded images kept in LRU cache, 0 disables the cache
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.prefetch = prefetch or 2 * self.workers
+        self.cache_size = cache_size
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-loader')
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def load(
+            self,
+            path: str,
+            mode: Optional[str] = 'RGB',
+            size: Optional[Tuple[int, int]] = None,
+            cache: bool = True
+            ) -> 'Image':
+        """
+        Decodes an image. Returned images may be shared through the cache, so they must not be modified in place
+
+        :param path: path to image
+        :param mode: optional, mode image is converted to. Image is kept in its own mode if None
+        :param size: optional, tuple of width and height the consumer needs. JPEG images are decoded
+         at 1/2, 1/4 or 1/8 scale if it is still not smaller than size. Images are not resized to size
+        :param cache: whether to look up and store image in the cache
+        :return: decoded PIL image
+        """
+
+        cache = cache and self.cache_size > 0
+        if cache:
+            # modification time and file size are part of the key, so images rewritten in place are decoded again
+            stat = os.stat(path)
+            key = (path, stat.st_mtime_ns, stat.st_size, mode, size)
+
+            with self._cache_lock:
+                img = self._cache.get(key)
+                if img is not None:
+                    self._cache.move_to_end(key)
+                    return img
+
+        img = Image.open(path)
+        if size is not None:
+            img.draft(mode, size)
+
+        if mode is not None and img.mode != mode:
+            img = img.convert(mode)
+        else:
+            img.load()
+
+        if cache:
+            with self._cache_lock:
+                self._cache[key] = img
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return img
+
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+        """
+        Applies function to items on the thread pool, keeping at most prefetch items in flight
+
+        :param func: function of one item
+        :param items: iterable of items
+        :return: iterator of results in items order
+        """
+
+        items = iter(items)
+        pending = deque()
+
+        for item in items:
+            pending.append(self._executor.submit(func, item))
+            if len(pending) >= self.prefetch:
+                break
+
+        while pending:
+            result = pending.popleft().result()
+
+            for item in items:
+                pending.append(self._executor.submit(func, item))
+                break
+
+            yield result
+
+    def imap(
+            self,
+            imgs: Iterable[Union['Image', str]],
+            mode: Optional[str] = 'RGB',
+            size: Optional[Tuple[int, int]] = None,
+            cache: bool = True
+            ) -> Iterator['Image']:
+        """
+        Decodes images ahead of the consumer
+
+        :param imgs: iterable of: paths to images, PIL image objects. PIL images are only converted to mode
+        :param mode: optional, mode images are converted to. Images are kept in their own mode if None
+        :param size: optional, tuple of width and height the consumer needs, see load
+        :param cache: whether to use the cache
+        :return: iterator of decoded PIL images in imgs order
+        """
+
+        def load(img: Union['Image', str]) -> 'Image':
+            if isinstance(img, str):
+                return self.load(img, mode=mode, size=size, cache=cache)
+
+            return img.convert(mode) if mode is not None and img.mode != mode else img
+
+        return self.map(load, imgs)
+
+    def clear(self) -> None:
+        """
+        Drops cached images
+        """
+
+        with self._cache_lock:
+            self._cache.clear()
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_loader() -> ImageLoader:
+    """
+    Returns process-wide image loader, creating it from config file on first call
+
+    :return: ImageLoader object
+    """
+
+    global _loader
+
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = ImageLoader(
+                    workers=config['loader']['workers'],
+                    prefetch=config['loader']['prefetch'],
+                    cache_size=config['loader']['cache_size']
+                )
+
+    return _loader
+
+
+def _reset_after_fork() -> None:
+    # threads of the parent's pool don't exist in a forked child(e.g. cleaning worker), so it gets its own loader
+    global _loader, _loader_lock
+
+    _loader = None
+    _loader_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
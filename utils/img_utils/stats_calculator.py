@@ -1,84 +1,153 @@
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
-import torch
-from PIL import Image
-from torchvision import transforms as T
+import numpy as np
 
-from .load_image_paths import load_dataset_paths
+from .load_image_paths import label_from_path, load_dataset_paths
+from .loader import get_loader
 
 
-class ImageStatsCalculator:
+class ChannelStats:
     """
-    Class to aggregate various statistical features of image dataset(folder)
+    Class to hold per-channel pixel count, mean and sum of squared deviations(M2) of a set of images.
+    Partial statistics are merged exactly with Chan's parallel update, so images can be processed
+    in any grouping and order without losing precision
     """
 
-    def __init__(self, root: str) -> None:
+    def __init__(self, channels: int = 3, histogram: bool = False) -> None:
         """
-        :param root: path to root folder
+        :param channels: number of color channels
+        :param histogram: whether to count 256-bin histogram of every channel
         """
 
-        self.root = root
-        self.mean, self.std = None, None
+        self.n_images = 0
+        self.count = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+        self.histogram = np.zeros(shape=(channels, 256), dtype=np.int64) if histogram else None
 
-    def calculate(self) -> Tuple[torch.Tensor, torch.Tensor]:
+    @classmethod
+    def from_pixels(cls, pixels: np.ndarray, histogram: bool = False) -> 'ChannelStats':
         """
-        Computes mean and standard deviation over whole dataset
-
-        :return: tuple of torch tensors [c1_mean, c2_mean, c3_mean], [c1_std, c2_std, c3_std]
-         where c1, c2, c3 refer to color channels
+        :param pixels: uint8 numpy array of shape (n_pixels, channels)
+        :param histogram: whether to count histograms
+        :return: ChannelStats of one image
         """
 
-        all_img_paths = load_dataset_paths(self.root)
+        stats = cls(channels=pixels.shape[1], histogram=histogram)
+        values = pixels.astype(np.float64) / 255
 
-        if (self.mean and self.std) is None:
-            self.mean, self.std = 0, 0
+        stats.n_images = 1
+        stats.count = len(values)
+        stats.mean = values.mean(axis=0)
+        stats.m2 = ((values - stats.mean) ** 2).sum(axis=0)
 
-        for img_path in all_img_paths:
-            img_matrix = self._prepare_img(img_path)
-            self.mean += img_matrix.mean(1)
-            self.std += img_matrix.std(1)
+        if histogram:
+            stats.histogram = np.stack([np.bincount(pixels[:, c], minlength=256) for c in range(pixels.shape[1])])
 
-        self.mean /= len(all_img_paths)
-        self.std /= len(all_img_paths)
+        return stats
 
-        return self.mean, self.std
+    def merge(self, other: 'ChannelStats') -> 'ChannelStats':
+        """
+        Adds statistics of other set of images in place
 
-    def _prepare_img(self, path: str) -> torch.Tensor:
+        :param other: ChannelStats object
+        :return: self
         """
-        Converts an image to pytorch tensor suitable for further statistical features aggregation
 
-        :param path: path ot image
-        :return: image tensor
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.n_images += other.n_images
+
+        if self.histogram is not None and other.histogram is not None:
+            self.histogram += other.histogram
+
+        return self
+
+    @property
+    def var(self) -> np.ndarray:
+        return self.m2 / self.count if self.count else np.full_like(self.m2, np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var)
+
+
+class ImageStatsCalculator:
+    """
+    Class to aggregate various statistical features of image dataset(folder)
+    """
+
+    def __init__(
+            self,
+            root: str,
+            max_size: Optional[Tuple[int, int]] = None,
+            per_label: bool = False,
+            histogram: bool = False
+            ) -> None:
+        """
+        :param root: path to root folder
+        :param max_size: optional, tuple of width and height. JPEG images are decoded at reduced resolution
+         not smaller than it, which is much faster and changes statistics only slightly
+        :param per_label: whether to compute statistics of every label(folder) too
+        :param histogram: whether to count 256-bin histogram of every channel
         """
 
-        img_tensor = self._img_to_tensor(path)
-        prepared_tensor = self._prepare_img_tensor(img_tensor)
+        self.root = root
+        self.max_size = max_size
+        self.per_label = per_label
+        self.histogram = histogram
 
-        return prepared_tensor
+        self.mean, self.std = None, None
+        self.stats: Optional[ChannelStats] = None
+        self.label_stats: Dict[str, ChannelStats] = {}
 
-    @staticmethod
-    def _img_to_tensor(path: str) -> torch.Tensor:
+    def calculate(self) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Opens an image, converts it to RGB format and then converts it to pytorch tensor
+        Computes mean and standard deviation over all pixels of the whole dataset in one pass.
+        Every call starts from scratch, results are also kept in stats and, per label, in label_stats
 
-        :param path: path to image
-        :return: tensor of shape (C x H x W)
+        :return: tuple of float64 numpy arrays [c1_mean, c2_mean, c3_mean], [c1_std, c2_std, c3_std]
+         where c1, c2, c3 refer to color channels. Values are in [0, 1] range, the same scale as ToTensor output.
+         Earlier versions returned torch tensors, use torch.as_tensor where tensors are needed.
+         torchvision's Normalize accepts the arrays as they are
         """
 
-        img = Image.open(path)
-        img_tensor = T.ToTensor()(img)
+        all_img_paths = sorted(load_dataset_paths(self.root))
+
+        stats = ChannelStats(histogram=self.histogram)
+        label_stats: Dict[str, ChannelStats] = {}
+
+        # images are decoded on the shared loader, partial results are merged in paths order,
+        # so the result doesn't depend on thread scheduling
+        for img_path, img_stats in zip(all_img_paths, get_loader().map(self._image_stats, all_img_paths)):
+            stats.merge(img_stats)
 
-        return img_tensor
+            if self.per_label:
+                label = label_from_path(img_path)
+                label_stats.setdefault(label, ChannelStats(histogram=self.histogram)).merge(img_stats)
 
-    @staticmethod
-    def _prepare_img_tensor(img_tensor: torch.Tensor) -> torch.Tensor:
+        self.stats, self.label_stats = stats, label_stats
+        self.mean, self.std = stats.mean, stats.std
+
+        return self.mean, self.std
+
+    def _image_stats(self, path: str) -> ChannelStats:
         """
-        Resizes tensor so statistical features can be computed
+        Decodes an image, at reduced resolution if max_size is set, and computes its statistics
 
-        :param img_tensor: tensor of shape (C x H x W)
-        :return: tensor of shape (C x (H * W))
+        :param path: path to image
+        :return: ChannelStats of the image
         """
 
-        prepared_tensor = img_tensor.view(img_tensor.size(0), -1)
+        # every image is read once, caching it would only evict images other consumers reuse
+        img = get_loader().load(path, size=self.max_size, cache=False)
+        pixels = np.asarray(img).reshape(-1, 3)
 
-        return prepared_tensor
+        return ChannelStats.from_pixels(pixels, histogram=self.histogram)
@@ -0,0 +1,51 @@
+import importlib
+import importlib.util
+import sys
+import types
+from typing import Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Tuple[Callable[[str], object], Callable[[], List[str]]]:
+    """
+    Creates module level __getattr__ and __dir__(PEP 562) which import package members on first access,
+    so importing a package doesn't import heavy dependencies(torch, sklearn, matplotlib etc.)
+    of the modules that are not used.
+    Members may have the same name as the module they are defined in(e.g. create_dataset): importing such a module
+    binds it as package attribute, which then is replaced with the member
+
+    :param package: package name, __name__ of its __init__ module
+    :param exports: dict of exported name and relative name of the module it is defined in
+    :return: tuple of __getattr__ and __dir__ functions
+    """
+
+    def _export_members(module: types.ModuleType) -> None:
+        # every member of the module is cached in package namespace, so later lookups don't go through __getattr__
+        for name, module_name in exports.items():
+            if importlib.util.resolve_name(module_name, package) == module.__name__:
+                types.ModuleType.__setattr__(sys.modules[package], name, getattr(module, name))
+
+    class _LazyPackage(types.ModuleType):
+        def __setattr__(self, name: str, value: object) -> None:
+            # import system binds every imported submodule as package attribute, including direct imports
+            # like `from embeddings.get_embedding import iter_embeddings` which never reach __getattr__
+            if (name in exports and isinstance(value, types.ModuleType)
+                    and value.__name__ == importlib.util.resolve_name(exports[name], package)):
+                _export_members(value)
+                return
+
+            super().__setattr__(name, value)
+
+    sys.modules[package].__class__ = _LazyPackage
+
+    def __getattr__(name: str) -> object:
+        if name not in exports:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+        _export_members(importlib.import_module(exports[name], package))
+
+        return getattr(sys.modules[package], name)
+
+    def __dir__() -> List[str]:
+        return sorted(exports)
+
+    return __getattr__, __dir__
@@ -0,0 +1 @@
+from .registry import ModelRegistry, get_registry, get_detector, get_embedder, warm_up
@@ -0,0 +1,158 @@
+import threading
+from typing import Optional
+
+import torch
+from PIL import Image
+from facenet_pytorch import MTCNN, InceptionResnetV1
+
+from utils.config import get_config
+from utils.logger import get_logger
+
+config = get_config()
+logger = get_logger(config['logger']['app_name'], __name__)
+
+EMBEDDER_WEIGHTS = 'vggface2'
+
+
+class ModelRegistry:
+    """
+    Class to hold face detector and face embedder shared by the whole process.
+    Models are loaded lazily on first access and are safe to request from multiple threads
+    """
+
+    def __init__(self, device: str = 'cpu', num_threads: Optional[int] = None, inference_mode: bool = True) -> None:
+        """
+        :param device: torch device models are placed on(cpu, cuda etc.)
+        :param num_threads: optional, number of threads torch uses for intra-op parallelism
+        :param inference_mode: whether to put models in eval mode and disable gradients for their parameters
+        """
+
+        self.device = torch.device(device)
+        self.num_threads = num_threads
+        self.inference_mode = inference_mode
+
+        self._lock = threading.Lock()
+        self._torch_configured = False
+        self._detector = None
+        self._embedder = None
+
+    @property
+    def detector(self) -> MTCNN:
+        """
+        :return: MTCNN face detector
+        """
+
+        if self._detector is None:
+            with self._lock:
+                if self._detector is None:
+                    self._configure_torch()
+                    self._detector = self._prepare(MTCNN(device=self.device))
+                    logger.debug(f'Loaded MTCNN detector on {self.device}')
+
+        return self._detector
+
+    @property
+    def embedder(self) -> InceptionResnetV1:
+        """
+        :return: InceptionResnetV1 face embedder
+        """
+
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._configure_torch()
+                    self._embedder = self._prepare(InceptionResnetV1(pretrained=EMBEDDER_WEIGHTS, device=self.device))
+                    logger.debug(f'Loaded InceptionResnetV1({EMBEDDER_WEIGHTS}) embedder on {self.device}')
+
+        return self._embedder
+
+    def warm_up(self, img_size: tuple = (512, 512)) -> None:
+        """
+        Loads both models and runs one dummy forward pass through each of them,
+        so the first real request doesn't pay for weights loading and lazy allocations
+
+        :param img_size: tuple of dummy image's (width, height)
+        """
+
+        self.detector.detect(Image.new('RGB', img_size))
+
+        with torch.no_grad():
+            self.embedder(torch.zeros((1, 3, 160, 160), device=self.device))
+
+        logger.debug('Models warmed up')
+
+    def _configure_torch(self) -> None:
+        """
+        Applies process-wide torch settings. Must be called while holding the lock
+        """
+
+        if self._torch_configured:
+            return
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        self._torch_configured = True
+
+    def _prepare(self, model: torch.nn.Module) -> torch.nn.Module:
+        """
+        Puts model in inference mode if registry is configured to do so
+
+        :param model: torch model
+        :return: the same model
+        """
+
+        if self.inference_mode:
+            model.eval()
+            model.requires_grad_(False)
+
+        return model
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Returns process-wide model registry, creating it from config file on first call
+
+    :return: ModelRegistry object
+    """
+
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    device=config['device'],
+                    num_threads=config['models']['num_threads'],
+                    inference_mode=config['models']['inference_mode']
+                )
+
+    return _registry
+
+
+def get_detector() -> MTCNN:
+    """
+    :return: shared MTCNN face detector
+    """
+
+    return get_registry().detector
+
+
+def get_embedder() -> InceptionResnetV1:
+    """
+    :return: shared InceptionResnetV1 face embedder
+    """
+
+    return get_registry().embedder
+
+
+def warm_up() -> None:
+    """
+    Loads shared models and runs a dummy forward pass through them
+    """
+
+    get_registry().warm_up(img_size=(config['images']['width'], config['images']['height']))
@@ -1,9 +1,12 @@
 from typing import List
 
 import matplotlib.pyplot as plt
-from PIL import Image
 
+from .img_utils.loader import get_loader
+from .profiling import profiled
 
+
+@profiled('plot', items='input_image_paths')
 def plot(
         input_image_paths: List[str],
         pred_image_paths: List[str],
@@ -13,16 +16,26 @@ def plot(
     Plots pairs of input images and predicted images and saves the plot
 
     :param input_image_paths: list of paths to inference(input) images
-    :param pred_image_paths: list of paths to predicted images
+    :param pred_image_paths: list of paths to predicted images, images predicted as None are left out
     :param labels: list of predicted labels
     """
 
+    results = [(input_path, pred_path, label) for input_path, pred_path, label
+               in zip(input_image_paths, pred_image_paths, labels) if pred_path is not None]
+    input_image_paths = [input_path for input_path, _, _ in results]
+    pred_image_paths = [pred_path for _, pred_path, _ in results]
+    labels = [label for _, _, label in results]
+
     nrows = 2 if len(input_image_paths) == 1 else len(input_image_paths)
     fig, axs = plt.subplots(nrows=nrows, ncols=2, figsize=(15, 15))
 
-    for i, (input_path, pred_path, label) in enumerate(zip(input_image_paths, pred_image_paths, labels)):
-        axs[i, 0].imshow(Image.open(input_path))
-        axs[i, 1].imshow(Image.open(pred_path))
+    # input images are usually still in the loader cache after inference, predicted images are decoded ahead
+    paths = [path for pair in zip(input_image_paths, pred_image_paths) for path in pair]
+    imgs = get_loader().imap(paths)
+
+    for i, (input_img, pred_img, label) in enumerate(zip(imgs, imgs, labels)):
+        axs[i, 0].imshow(input_img)
+        axs[i, 1].imshow(pred_img)
 
         axs[i, 0].get_xaxis().set_visible(False)
         axs[i, 0].get_yaxis().set_visible(False)
@@ -0,0 +1,210 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+_enabled = False
+_events: List[dict] = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+def enable(enabled: bool = True) -> None:
+    """
+    Turns stage recording on or off for the current process. Recording is off by default.
+    Stages run in worker processes(e.g. dataset cleaning with several workers) are not recorded
+
+    :param enabled: whether to record stages
+    """
+
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Drops recorded stages
+    """
+
+    with _lock:
+        _events.clear()
+
+
+class _Stage:
+    """
+    Context manager which records wall time, CPU time of the calling thread and item count of one stage run
+    """
+
+    __slots__ = ('name', 'items', '_wall_start', '_cpu_start')
+
+    def __init__(self, name: str, items: int) -> None:
+        self.name = name
+        self.items = items
+
+    def __enter__(self) -> '_Stage':
+        self._cpu_start = time.thread_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        wall_end = time.perf_counter()
+        cpu = time.thread_time() - self._cpu_start
+
+        event = {
+            'name': self.name,
+            'start': self._wall_start - _origin,
+            'wall': wall_end - self._wall_start,
+            'cpu': cpu,
+            'items': self.items,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+
+        with _lock:
+            _events.append(event)
+
+
+class _NullStage:
+    """
+    Context manager used while recording is off
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullStage':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, items: int = 1):
+    """
+    Records a stage: with stage('decode', items=len(paths)): ...
+    While recording is off a shared no-op context manager is returned
+
+    :param name: stage name
+    :param items: number of items(images, embeddings etc.) processed by the stage
+    :return: context manager
+    """
+
+    return _Stage(name, items) if _enabled else _NULL_STAGE
+
+
+def profiled(name: str = None, items: str = None) -> Callable:
+    """
+    Decorator which records every call of a function as a stage. While recording is off
+    the only overhead is one global flag check per call
+
+    :param name: optional, stage name. Defaults to function qualified name
+    :param items: optional, name of the argument whose length is the number of processed items. Defaults to 1 item
+    :return: decorator
+    """
+
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__qualname__
+        signature = inspect.signature(func) if items else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            n_items = 1
+            if signature is not None:
+                try:
+                    n_items = len(signature.bind_partial(*args, **kwargs).arguments[items])
+                except (KeyError, TypeError):
+                    pass
+
+            with _Stage(stage_name, n_items):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary() -> List[dict]:
+    """
+    Aggregates recorded stages by name. Nested stages are counted in their parents too
+
+    :return: list of dicts {'stage', 'calls', 'items', 'wall', 'cpu', 'wall_per_item'} sorted by total wall time.
+     Times are in seconds
+    """
+
+    with _lock:
+        events = list(_events)
+
+    stages: Dict[str, dict] = {}
+    for event in events:
+        row = stages.setdefault(event['name'], {'stage': event['name'], 'calls': 0, 'items': 0, 'wall': 0., 'cpu': 0.})
+        row['calls'] += 1
+        row['items'] += event['items']
+        row['wall'] += event['wall']
+        row['cpu'] += event['cpu']
+
+    for row in stages.values():
+        row['wall_per_item'] = row['wall'] / row['items'] if row['items'] else 0.
+
+    return sorted(stages.values(), key=lambda row: row['wall'], reverse=True)
+
+
+def format_summary(rows: Optional[List[dict]] = None) -> str:
+    """
+    :param rows: optional, output of summary. Computed if not given
+    :return: summary as a text table
+    """
+
+    rows = summary() if rows is None else rows
+    width = max([len('stage')] + [len(row['stage']) for row in rows])
+
+    lines = [f'{"stage":<{width}} {"calls":>8} {"items":>9} {"wall, s":>10} {"cpu, s":>10} {"ms/item":>10}']
+    for row in rows:
+        lines.append(f'{row["stage"]:<{width}} {row["calls"]:>8} {row["items"]:>9} {row["wall"]:>10.3f} '
+                     f'{row["cpu"]:>10.3f} {1000 * row["wall_per_item"]:>10.3f}')
+
+    return '\n'.join(lines)
+
+
+def save_trace(path: str) -> None:
+    """
+    Saves recorded stages in Chrome trace event format(chrome://tracing, ui.perfetto.dev).
+    The file also holds the aggregated summary under 'summary' key, which trace viewers ignore
+
+    :param path: path to output .json file
+    """
+
+    with _lock:
+        events = list(_events)
+
+    trace = {
+        'traceEvents': [
+            {
+                'name': event['name'],
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': event['wall'] * 1e6,
+                'pid': event['pid'],
+                'tid': event['tid'],
+                'args': {'items': event['items'], 'cpu_ms': event['cpu'] * 1e3}
+            }
+            for event in events
+        ],
+        'displayTimeUnit': 'ms',
+        'summary': summary()
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as output_file:
+        json.dump(trace, output_file)